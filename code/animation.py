@@ -0,0 +1,75 @@
+from typing import Optional
+
+import pygame
+
+from assets import assets
+from settings import SCREEN_WIDTH, SCREEN_HEIGHT
+from support import clip_blits, composite, merge_tiles
+
+
+class AnimationClock:
+    """Current frame of an animation, advanced once per frame for everything that plays it in sync."""
+
+    def __init__(self, frame_count: int, speed: float = 4):
+        self.frame_count = frame_count
+        self.speed = speed
+        self.frame_index = 0
+
+    def update(self, dt: float) -> None:
+        self.frame_index += self.speed * dt
+        if self.frame_index >= self.frame_count:
+            self.frame_index = 0
+
+    @property
+    def frame(self) -> int:
+        return int(self.frame_index)
+
+
+class AnimatedTiles:
+    """Tiles sharing one animation, baked into a surface per frame for every rect of adjacent tiles.
+
+    Drawn as a CameraGroup renderer, so the tiles are neither sprites nor part of the y-sort.
+    """
+
+    def __init__(self, tiles: list[tuple[int, int]], frames: list[pygame.Surface], clock: AnimationClock, tile_size: int):
+        self.clock = clock
+        # Fully opaque animations are baked without per-pixel alpha, blitting those is a plain copy
+        opaque = all(pygame.mask.from_surface(frame, 254).count() == frame.get_width() * frame.get_height()
+                     for frame in frames)
+
+        # World rects and their surfaces, one per frame
+        self.rects = []
+        self.surfs = []
+        for rect in merge_tiles(tiles):
+            world_rect = pygame.Rect(rect.x * tile_size, rect.y * tile_size, rect.width * tile_size, rect.height * tile_size)
+            positions = [(x, y) for y in range(world_rect.top, world_rect.bottom, tile_size)
+                         for x in range(world_rect.left, world_rect.right, tile_size)]
+            self.rects.append(world_rect)
+            surfs = [composite([(x, y, frame) for x, y in positions], *world_rect) for frame in frames]
+            self.surfs.append([assets.add_baked(surf.convert() if opaque else surf) for surf in surfs])
+
+        # Frame and screen rects as of the last changed_rects() call
+        self.drawn_frame = None
+        self.drawn_rects = []
+
+    def visible(self, offset: pygame.math.Vector2) -> list[tuple[int, tuple[float, float]]]:
+        """Index and screen position of every rect on the screen."""
+        camera_rect = pygame.Rect(offset, (SCREEN_WIDTH, SCREEN_HEIGHT))
+        return [(index, (rect.x - offset.x, rect.y - offset.y))
+                for index, rect in enumerate(self.rects) if rect.colliderect(camera_rect)]
+
+    def draw(self, surface: pygame.Surface, offset: pygame.math.Vector2, areas: Optional[list[pygame.Rect]] = None) -> int:
+        frame = self.clock.frame
+        visible = self.visible(offset)
+        surface.blits(clip_blits([(self.surfs[index][frame], pos) for index, pos in visible], areas), doreturn=False)
+        return len(visible)
+
+    def changed_rects(self, offset: pygame.math.Vector2) -> list[pygame.Rect]:
+        """Every visible rect when the frame changed or the view moved, otherwise nothing."""
+        rects = [pygame.Rect(pos, self.rects[index].size) for index, pos in self.visible(offset)]
+        if self.clock.frame == self.drawn_frame and rects == self.drawn_rects:
+            return []
+        changed = rects + self.drawn_rects
+        self.drawn_frame = self.clock.frame
+        self.drawn_rects = rects
+        return changed
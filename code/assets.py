@@ -0,0 +1,170 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterator, Optional
+
+import pygame
+
+import atlas
+from startup import startup
+
+
+# Longest time preload() waits for the thread pool before yielding
+PRELOAD_STEP = 1 / 60
+
+
+class Assets:
+    """Loads each image, sound and font once and hands out the shared objects.
+
+    Images are always converted to the display format, so the display has to exist before the first image is loaded.
+    When a packed atlas is available (see atlas.py) images come out of it as subsurfaces, otherwise from their files.
+    """
+
+    def __init__(self):
+        self.images = {}
+        self.folders = {}
+        self.sounds = {}
+        self.fonts = {}
+
+        # Running totals for stats()
+        self.image_bytes = 0
+        self.sound_bytes = 0
+        self.baked_bytes = 0
+
+        # Loaded with the first image or by preload()
+        self.atlas = None
+        self.atlas_index = None
+
+    def load_atlas_index(self) -> None:
+        if self.atlas_index is None:
+            self.atlas_index = atlas.read_index() or {'images': {}, 'folders': {}}
+
+    def load_atlas(self, loaded: Optional[pygame.Surface] = None) -> None:
+        self.load_atlas_index()
+        if self.atlas_index['images'] and self.atlas is None:
+            self.atlas = (loaded or pygame.image.load(atlas.ATLAS_IMAGE)).convert_alpha()
+            self.image_bytes += surface_bytes(self.atlas)
+
+    def image(self, path: str) -> pygame.Surface:
+        path = os.path.normpath(path)
+        surf = self.images.get(path)
+        if surf is None:
+            if self.atlas is None:
+                self.load_atlas()
+            rect = self.atlas_index['images'].get(path)
+            if rect:
+                surf = self.images[path] = self.atlas.subsurface(rect)
+            else:
+                surf = self.add_image(path, pygame.image.load(path))
+        return surf
+
+    def add_image(self, path: str, loaded: pygame.Surface) -> pygame.Surface:
+        surf = self.images[path] = loaded.convert_alpha()
+        self.image_bytes += surface_bytes(surf)
+        return surf
+
+    def add_baked(self, surf: pygame.Surface) -> pygame.Surface:
+        """Count a surface composited at load time, e.g. map chunks, which is not cached here but stays in memory."""
+        self.baked_bytes += surface_bytes(surf)
+        return surf
+
+    def folder(self, path: str) -> list[pygame.Surface]:
+        """Every image in a folder, numbered frames in numeric order."""
+        return list(self.folder_dict(path).values())
+
+    def folder_dict(self, path: str) -> dict[str, pygame.Surface]:
+        """Every image in a folder keyed by file name without extension."""
+        path = os.path.normpath(path)
+        surfs = self.folders.get(path)
+        if surfs is None:
+            if self.atlas is None:
+                self.load_atlas()
+            files = self.atlas_index['folders'].get(path) or atlas.image_files(path)
+            surfs = self.folders[path] = {os.path.basename(file).split('.')[0]: self.image(file) for file in files}
+        return surfs
+
+    def sound(self, path: str, volume: float) -> pygame.mixer.Sound:
+        """The sound at path; the volume is shared by everything playing it."""
+        sound = self.sounds.get(path)
+        if sound is None:
+            sound = self.add_sound(path, pygame.mixer.Sound(path))
+        sound.set_volume(volume)
+        return sound
+
+    def add_sound(self, path: str, sound: pygame.mixer.Sound) -> pygame.mixer.Sound:
+        self.sounds[path] = sound
+        self.sound_bytes += sound_bytes(sound)
+        return sound
+
+    def preload(self, folders: list[str], images: list[str], sounds: list[str]) -> Iterator[float]:
+        """Read and decode files on a thread pool, yielding the finished fraction about once per frame.
+
+        Only the conversion to the display format happens on the calling thread, which stays free to pump events between steps.
+        """
+        self.load_atlas_index()
+        image_paths = [path for folder in folders for root, _, __ in os.walk(folder) for path in atlas.image_files(root)]
+        image_paths += [os.path.normpath(path) for path in images]
+        image_paths = [path for path in dict.fromkeys(image_paths)
+                       if path not in self.images and path not in self.atlas_index['images']]
+        if self.atlas_index['images'] and self.atlas is None:
+            image_paths.insert(0, atlas.ATLAS_IMAGE)
+        sound_paths = [path for path in sounds if path not in self.sounds]
+
+        with ThreadPoolExecutor() as pool:
+            jobs = {pool.submit(timed_call, pygame.image.load, path): (self.add_image, path) for path in image_paths}
+            jobs.update({pool.submit(timed_call, pygame.mixer.Sound, path): (self.add_sound, path) for path in sound_paths})
+            pending = set(jobs)
+            while pending:
+                done, pending = wait(pending, timeout=PRELOAD_STEP, return_when=FIRST_COMPLETED)
+                for job in done:
+                    add, path = jobs[job]
+                    loaded, seconds = job.result()
+                    startup.add(f'decode {asset_group(path)}', seconds)
+                    with startup.phase('convert'):
+                        if path == atlas.ATLAS_IMAGE:
+                            self.load_atlas(loaded)
+                        else:
+                            add(path, loaded)
+                yield 1 - len(pending) / len(jobs)
+
+    def font(self, path: str, size: int) -> pygame.font.Font:
+        font = self.fonts.get((path, size))
+        if font is None:
+            font = self.fonts[(path, size)] = pygame.font.Font(path, size)
+        return font
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'images': len(self.images),
+            'image_bytes': self.image_bytes,
+            'sounds': len(self.sounds),
+            'sound_bytes': self.sound_bytes,
+            'baked_bytes': self.baked_bytes,
+        }
+
+
+def timed_call(load: Callable, path: str) -> tuple[Any, float]:
+    start = time.perf_counter()
+    return load(path), time.perf_counter() - start
+
+
+def asset_group(path: str) -> str:
+    """Top level asset folder below graphics, or the folder itself for everything else, e.g. character or audio."""
+    parts = os.path.normpath(path).split(os.sep)
+    group = parts[2] if parts[1] == 'graphics' else parts[1]
+    return group.split('.')[0]
+
+
+def surface_bytes(surf: pygame.Surface) -> int:
+    return surf.get_bytesize() * surf.get_width() * surf.get_height()
+
+
+def sound_bytes(sound: pygame.mixer.Sound) -> int:
+    mixer = pygame.mixer.get_init()
+    if mixer is None:
+        return 0
+    frequency, sample_format, channels = mixer
+    return round(sound.get_length() * frequency) * channels * abs(sample_format) // 8
+
+
+assets = Assets()
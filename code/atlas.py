@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+from typing import Optional
+
+import pygame
+
+# Generated by running this module, both files are ignored by git
+ATLAS_IMAGE = '../graphics/atlas.png'
+ATLAS_INDEX = '../graphics/atlas.json'
+
+# Folders loaded through the asset cache at runtime, the map tilesets are loaded by pytmx instead
+ATLAS_FOLDERS = [
+    '../graphics/character',
+    '../graphics/fruit',
+    '../graphics/overlay',
+    '../graphics/rain',
+    '../graphics/soil',
+    '../graphics/soil_water',
+    '../graphics/stumps',
+    '../graphics/water',
+]
+ATLAS_WIDTH = 2048
+
+
+def frame_key(filename: str) -> tuple:
+    """Numbered frames in numeric order, then named images alphabetically."""
+    name = filename.split('.')[0]
+    return (0, int(name), '') if name.isdigit() else (1, 0, name)
+
+
+def image_files(folder: str) -> list[str]:
+    """Paths of the images directly inside folder, in frame order."""
+    files = [filename for filename in os.listdir(folder)
+             if filename.endswith('.png') and os.path.isfile(os.path.join(folder, filename))]
+    return [os.path.normpath(os.path.join(folder, filename)) for filename in sorted(files, key=frame_key)]
+
+
+def shelf_pack(sizes: list[tuple[int, int]], width: int) -> tuple[list[tuple[int, int]], int]:
+    """Place rects left to right in rows, tallest first. Returns the positions and the total height."""
+    positions = [(0, 0)] * len(sizes)
+    x = y = row_height = 0
+    for index in sorted(range(len(sizes)), key=lambda index: -sizes[index][1]):
+        w, h = sizes[index]
+        if x + w > width:
+            x, y = 0, y + row_height
+            row_height = 0
+        positions[index] = (x, y)
+        x += w
+        row_height = max(row_height, h)
+    return positions, y + row_height
+
+
+def source_mtimes(folders: list[str]) -> dict[str, float]:
+    """Modification times of every atlas folder and image, a folder changes when files are added or removed."""
+    mtimes = {}
+    for root in folders:
+        for folder, _, __ in os.walk(root):
+            folder = os.path.normpath(folder)
+            mtimes[folder] = os.stat(folder).st_mtime
+            for path in image_files(folder):
+                mtimes[path] = os.stat(path).st_mtime
+    return mtimes
+
+
+def build(folders: list[str] = ATLAS_FOLDERS, width: int = ATLAS_WIDTH) -> dict:
+    folder_frames = {}
+    for root in folders:
+        for folder, _, __ in os.walk(root):
+            frames = image_files(folder)
+            if frames:
+                folder_frames[os.path.normpath(folder)] = frames
+
+    paths = [path for frames in folder_frames.values() for path in frames]
+    surfs = [pygame.image.load(path) for path in paths]
+    positions, height = shelf_pack([surf.get_size() for surf in surfs], width)
+
+    atlas = pygame.Surface((width, height), pygame.SRCALPHA)
+    rects = {}
+    for path, surf, pos in zip(paths, surfs, positions):
+        # Copy the pixels as they are instead of blending them onto the transparent atlas
+        atlas.blit(surf, pos, special_flags=pygame.BLEND_RGBA_MAX)
+        rects[path] = [*pos, *surf.get_size()]
+    pygame.image.save(atlas, ATLAS_IMAGE)
+
+    index = {'images': rects, 'folders': folder_frames, 'mtimes': source_mtimes(folders)}
+    with open(ATLAS_INDEX, 'w') as file:
+        json.dump(index, file)
+    return index
+
+
+def read_index() -> Optional[dict]:
+    """The atlas index, or None when the atlas was not built or any source image changed since."""
+    if not os.path.exists(ATLAS_IMAGE) or not os.path.exists(ATLAS_INDEX):
+        return None
+    with open(ATLAS_INDEX) as file:
+        index = json.load(file)
+    for path, mtime in index['mtimes'].items():
+        if not os.path.exists(path) or os.stat(path).st_mtime != mtime:
+            return None
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack the sprite images loaded at runtime into a single atlas image and index.')
+    parser.add_argument('--width', type=int, default=ATLAS_WIDTH)
+    args = parser.parse_args()
+
+    index = build(width=args.width)
+    print(f"packed {len(index['images'])} images from {len(index['folders'])} folders into {ATLAS_IMAGE}")
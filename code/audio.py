@@ -0,0 +1,60 @@
+from collections import deque
+
+import pygame
+
+from settings import AUDIO_VOLUMES, SFX_CHANNELS, SFX_INSTANCES
+
+
+class Audio:
+    """Music streamed from disk, and sound effects on a fixed pool of mixer channels.
+
+    Every sound plays in a volume group, its final volume is its own volume times the group volume.
+    """
+
+    def __init__(self):
+        self.volumes = dict(AUDIO_VOLUMES)
+        self.music_volume = 1.0
+
+        # Created with the first sound, the mixer has to be initialised by then
+        self.channels = None
+        self.channel_groups = {}
+        self.play_order = deque()
+
+    def play_music(self, path: str, volume: float, loops: int = -1) -> None:
+        """Stream a track instead of decoding all of it into memory like a Sound."""
+        self.music_volume = volume
+        pygame.mixer.music.load(path)
+        pygame.mixer.music.set_volume(volume * self.volumes['music'])
+        pygame.mixer.music.play(loops)
+
+    def play(self, sound: pygame.mixer.Sound, group: str = 'sfx') -> None:
+        """Play a sound effect, cutting off its oldest instance or the oldest sound when the pool is full."""
+        if self.channels is None:
+            pygame.mixer.set_num_channels(SFX_CHANNELS)
+            self.channels = [pygame.mixer.Channel(index) for index in range(SFX_CHANNELS)]
+
+        same_sound = [channel for channel in self.play_order if channel.get_sound() is sound]
+        if len(same_sound) >= SFX_INSTANCES:
+            channel = same_sound[0]
+        else:
+            channel = next((channel for channel in self.channels if not channel.get_busy()), None)
+            if channel is None:
+                channel = self.play_order[0]
+
+        if channel in self.play_order:
+            self.play_order.remove(channel)
+        self.play_order.append(channel)
+        self.channel_groups[channel] = group
+        channel.set_volume(self.volumes[group])
+        channel.play(sound)
+
+    def set_volume(self, group: str, volume: float) -> None:
+        self.volumes[group] = volume
+        if group == 'music':
+            pygame.mixer.music.set_volume(self.music_volume * volume)
+        for channel, channel_group in self.channel_groups.items():
+            if channel_group == group:
+                channel.set_volume(volume)
+
+
+audio = Audio()
@@ -0,0 +1,245 @@
+# Imported first so the startup clock covers every other import
+from startup import startup
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Optional
+
+# Headless: the dummy drivers must be selected before pygame is initialised
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+import support
+import timer
+from assets import assets
+from level import Level, PRELOAD_FOLDERS, PRELOAD_IMAGES, PRELOAD_SOUNDS
+from settings import SCREEN_WIDTH, SCREEN_HEIGHT, TILE_SIZE, PLAYER_TOOL_OFFSET, STARTUP_BUDGET
+from soil import FARMABLE
+from world import tileset_images
+
+FIXED_DT = 1 / 60
+SECTIONS = ['custom_draw', 'all_sprites.update', 'plant_collision', 'rain.update', 'tint.apply']
+
+
+class SimulatedClock:
+    def __init__(self, dt: float):
+        self.step = round(dt * 1000)
+        # Timer treats a start time of 0 as inactive, so the clock never reads 0
+        self.ticks = 1000
+
+    def get_ticks(self) -> int:
+        return self.ticks
+
+    def advance(self) -> None:
+        self.ticks += self.step
+
+
+class ScriptedKeys:
+    def __init__(self):
+        self.pressed = set()
+
+    def __getitem__(self, key: int) -> bool:
+        return key in self.pressed
+
+    def get_pressed(self) -> 'ScriptedKeys':
+        return self
+
+
+class Script:
+    """Timeline of key presses and player placements, indexed by frame."""
+
+    def __init__(self):
+        self.frame = 0
+        self.actions = []
+
+    def wait(self, frames: int) -> None:
+        self.frame += frames
+
+    def hold(self, keys: list[int], frames: int) -> None:
+        self.actions.append((self.frame, 'keys', keys))
+        self.wait(frames)
+        self.actions.append((self.frame, 'keys', []))
+
+    def tap(self, key: int, wait: int) -> None:
+        self.hold([key], 1)
+        self.wait(wait)
+
+    def goto(self, pos: tuple[int, int]) -> None:
+        self.actions.append((self.frame, 'goto', pos))
+        self.wait(1)
+
+
+def build_script(level: Level) -> Script:
+    """Walk, hoe, plant, chop, water, sleep and shop."""
+    farm_tiles = [pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+                  for x, y in level.soil_layer.grid.find(FARMABLE)[:6]]
+    tree = sorted(level.tree_sprites.sprites(), key=lambda sprite: (sprite.rect.y, sprite.rect.x))[0]
+    interactables = {sprite.name: sprite.rect.center for sprite in level.interactable_sprites}
+
+    script = Script()
+    for key in [pygame.K_LEFT, pygame.K_DOWN, pygame.K_RIGHT, pygame.K_UP]:
+        script.hold([key], 40)
+
+    # Hoe and plant a row, tool starts out as the hoe
+    for tile in farm_tiles:
+        script.goto(tile.center)
+        script.tap(pygame.K_SPACE, 30)
+        script.tap(pygame.K_LCTRL, 30)
+
+    # Axe
+    script.tap(pygame.K_q, 15)
+    script.goto(tree.rect.center)
+    for _ in range(5):
+        script.tap(pygame.K_SPACE, 30)
+
+    # Water
+    script.tap(pygame.K_q, 15)
+    for tile in farm_tiles:
+        script.goto(tile.center)
+        script.tap(pygame.K_SPACE, 30)
+
+    # Sleep through the night
+    script.actions.append((script.frame, 'interact', interactables['Bed']))
+    script.tap(pygame.K_RETURN, 300)
+
+    # Sell something in the shop
+    script.actions.append((script.frame, 'interact', interactables['Trader']))
+    script.tap(pygame.K_RETURN, 15)
+    script.tap(pygame.K_DOWN, 15)
+    script.tap(pygame.K_SPACE, 15)
+    script.tap(pygame.K_ESCAPE, 15)
+    return script
+
+
+def place_player(level: Level, pos: tuple[int, int], target: bool) -> None:
+    """Move the player to pos, or so that its tool target lands on pos."""
+    player = level.player
+    player.status = 'down_idle'
+    center = pygame.math.Vector2(pos)
+    if target:
+        center -= PLAYER_TOOL_OFFSET['down']
+    player.pos.update(center)
+    player.hitbox.center = (round(center.x), round(center.y))
+    player.rect.center = player.hitbox.center
+
+
+def timed(samples: list[float], func: Callable) -> Callable:
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        samples.append(time.perf_counter() - start)
+        return result
+    return wrapper
+
+
+def summarize(samples: list[float]) -> dict:
+    millis = [sample * 1000 for sample in samples]
+    if len(millis) < 2:
+        millis = millis * 2 or [0.0, 0.0]
+    percentiles = statistics.quantiles(millis, n=100, method='inclusive')
+    return {
+        'count': len(samples),
+        'mean': statistics.fmean(millis),
+        'p50': percentiles[49],
+        'p90': percentiles[89],
+        'p99': percentiles[98],
+        'max': max(millis),
+    }
+
+
+def run(frames: Optional[int], seed: int, dt: float, rain: bool) -> dict:
+    """Play the script headless; frames defaults to the length of the script."""
+    random.seed(seed)
+    clock = SimulatedClock(dt)
+    keys = ScriptedKeys()
+    timer.clock = clock.get_ticks
+    support.key_source = keys.get_pressed
+
+    # Same startup sequence as the game, minus the loading screen
+    startup.add('import', startup.elapsed())
+    with startup.phase('pygame.init'):
+        pygame.init()
+    with startup.phase('display'):
+        pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    with startup.phase('preload'):
+        for _ in assets.preload(PRELOAD_FOLDERS, PRELOAD_IMAGES + tileset_images(), PRELOAD_SOUNDS):
+            pass
+    with startup.phase('level'):
+        level = Level()
+    if rain:
+        level.raining = level.soil_layer.raining = True
+
+    samples = {section: [] for section in SECTIONS}
+    level.all_sprites.custom_draw = timed(samples['custom_draw'], level.all_sprites.custom_draw)
+    level.all_sprites.update = timed(samples['all_sprites.update'], level.all_sprites.update)
+    level.plant_collision = timed(samples['plant_collision'], level.plant_collision)
+    level.rain.update = timed(samples['rain.update'], level.rain.update)
+    level.tint.apply = timed(samples['tint.apply'], level.tint.apply)
+
+    script = build_script(level)
+    frames = frames or script.frame
+    actions = {}
+    for frame, action, arg in script.actions:
+        actions.setdefault(frame, []).append((action, arg))
+
+    frame_samples = []
+    for frame in range(frames):
+        for action, arg in actions.get(frame, []):
+            if action == 'keys':
+                keys.pressed = set(arg)
+            else:
+                place_player(level, arg, target=action == 'goto')
+
+        pygame.event.pump()
+        start = time.perf_counter()
+        dirty_rects = level.run(dt)
+        frame_samples.append(time.perf_counter() - start)
+        if dirty_rects is None:
+            pygame.display.update()
+        else:
+            pygame.display.update(dirty_rects)
+        clock.advance()
+        if frame == 0:
+            startup.add('first frame', time.perf_counter() - start)
+            startup.finish()
+
+    pygame.quit()
+    return {
+        'frames': frames,
+        'seed': seed,
+        'dt': dt,
+        'rain': rain,
+        'frame': summarize(frame_samples),
+        'sections': {section: summarize(section_samples) for section, section_samples in samples.items()},
+        'assets': assets.stats(),
+        'startup': startup.record(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a scripted, deterministic play session headless and report frame times.')
+    parser.add_argument('--frames', type=int, help='defaults to the length of the input script')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dt', type=float, default=FIXED_DT)
+    parser.add_argument('--no-rain', dest='rain', action='store_false')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--startup-budget', type=float, default=STARTUP_BUDGET, help='seconds, exit with an error above it')
+    args = parser.parse_args()
+
+    results = run(args.frames, args.seed, args.dt, args.rain)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    for name, stats in [('frame', results['frame'])] + list(results['sections'].items()):
+        print(f"{name:20} p50 {stats['p50']:7.3f}ms  p90 {stats['p90']:7.3f}ms  p99 {stats['p99']:7.3f}ms")
+    print(startup.report())
+
+    if startup.total > args.startup_budget:
+        print(f'startup took {startup.total:.2f}s, over the budget of {args.startup_budget:.2f}s')
+        sys.exit(1)
@@ -0,0 +1,24 @@
+import pygame
+
+from settings import TILE_SIZE
+from spatial import SpatialGroup
+
+
+class CollisionGroup(SpatialGroup):
+    """Sprite group that indexes member hitboxes in a tile grid, so collision checks only look at nearby sprites.
+
+    Static map collision is stored as plain rects without a sprite, see add_static.
+    """
+    rect_attribute = 'hitbox'
+
+    def __init__(self):
+        super().__init__(TILE_SIZE)
+
+    def add_static(self, rect: pygame.Rect) -> None:
+        key = tuple(rect)
+        self.order[key] = next(self.counter)
+        self.index.insert(key, rect)
+
+    def hitboxes_near(self, rect: pygame.Rect) -> list[pygame.Rect]:
+        """Sprite hitboxes and static rects that share a tile with rect."""
+        return [pygame.Rect(item) if isinstance(item, tuple) else item.hitbox for item in self.query(rect)]
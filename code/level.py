@@ -1,17 +1,34 @@
+from itertools import chain, count
 from random import randint
+from typing import Optional
 
 import pygame
-import pytmx
 
+from animation import AnimatedTiles, AnimationClock
+from assets import assets
+from atlas import ATLAS_FOLDERS
+from audio import audio
+from collision import CollisionGroup
 from overlay import Overlay
 from player import Player
-from settings import LAYERS, SCREEN_HEIGHT, SCREEN_WIDTH, TILE_SIZE, PLAYER_TOOL_OFFSET, DEBUG
+from profiler import profiler
+from settings import LAYERS, SCREEN_HEIGHT, SCREEN_WIDTH, TILE_SIZE, PLAYER_TOOL_OFFSET, DEBUG, CAMERA_CELL_SIZE, \
+    CHUNK_SIZE, DIRTY_RECTS, DIRTY_RECT_LIMIT, DIRTY_AREA_LIMIT, TINT_WORLD_ONLY
 from sky import Rain, Sky
 from soil import SoilLayer
-from sprites import GenericSprite, Water, WildFlower, Tree, Interactable, Particle
-from support import import_images_from_folder
+from spatial import SpatialHash, SpatialGroup
+from startup import startup
+from sprites import GenericSprite, WildFlower, Tree, Interactable, Particle
+from support import bake_chunks, bake_row_strips, clip_blits, merge_rects, merge_tiles
+from tint import ScreenTint
 from transition import Transition
 from menu import Menu
+from world import WorldMap
+
+# Decoded by the loading screen before the level is built, along with the map's tileset_images()
+PRELOAD_FOLDERS = ATLAS_FOLDERS
+PRELOAD_IMAGES = ['../graphics/world/ground.png']
+PRELOAD_SOUNDS = ['../audio/success.wav', '../audio/axe.mp3', '../audio/hoe.wav', '../audio/plant.wav', '../audio/water.mp3']
 
 
 class Level:
@@ -21,71 +38,85 @@ class Level:
 
         # Sprite groups
         self.all_sprites = CameraGroup()
-        self.collision_sprites = pygame.sprite.Group()
-        self.tree_sprites = pygame.sprite.Group()
+        self.collision_sprites = CollisionGroup()
+        self.tree_sprites = SpatialGroup(TILE_SIZE)
         self.interactable_sprites = pygame.sprite.Group()
 
-        self.soil_layer = SoilLayer(self.all_sprites, self.collision_sprites)
+        with startup.phase('map'):
+            self.world_map = WorldMap()
+        self.soil_layer = SoilLayer(self.all_sprites, self.collision_sprites, self.world_map)
         self.setup()
         self.overlay = Overlay(self.player)
         self.transition = Transition(self.reset, self.player)
 
         # Sky
-        self.rain = Rain(self.all_sprites)
+        self.rain = Rain(self.world_map)
+        self.all_sprites.add_renderer(LAYERS['rain floor'], self.rain.floor)
+        self.all_sprites.add_renderer(LAYERS['rain drops'], self.rain.drops)
         self.raining = randint(0, 10) > 7
         self.soil_layer.raining = self.raining
         self.sky = Sky()
+        self.tint = ScreenTint()
+        self.tint.add_source(self.sky.color)
+        self.tint.add_source(self.transition.tint)
 
         # Shop
         self.shop_active = False
         self.menu = Menu(self.player, self.toggle_shop)
 
-        self.success = pygame.mixer.Sound('../audio/success.wav')
-        self.success.set_volume(0.05)
+        self.success = assets.sound('../audio/success.wav', 0.05)
 
-        self.bg_music = pygame.mixer.Sound('../audio/music.mp3')
-        self.bg_music.set_volume(0.01)
-        self.bg_music.play(loops=-1)
+        audio.play_music('../audio/music.mp3', 0.01)
 
-    def setup(self) -> None:
-        tmx_data = pytmx.util_pygame.load_pygame('../data/map.tmx')
+        # Dirty rect rendering
+        self.last_offset = pygame.math.Vector2(-1, -1)
+        self.last_tint_color = None
+        self.menu_drawn = False
 
-        # House
-        for layer in ['HouseFloor', 'HouseFurnitureBottom']:
-            for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-                GenericSprite((x*TILE_SIZE, y*TILE_SIZE), surf, self.all_sprites, LAYERS['house bottom'])
-        for layer in ['HouseWalls', 'HouseFurnitureTop']:
-            for x, y, surf in tmx_data.get_layer_by_name(layer).tiles():
-                GenericSprite((x*TILE_SIZE, y*TILE_SIZE), surf, self.all_sprites, LAYERS['main'])
+    def setup(self) -> None:
+        # House, floor and bottom furniture never overlap the player and get baked into chunks
+        house_bottom = self.layer_tiles(['HouseFloor', 'HouseFurnitureBottom'])
+        for pos, surf in bake_chunks(house_bottom, CHUNK_SIZE):
+            GenericSprite(pos, assets.add_baked(surf), self.all_sprites, LAYERS['house bottom'])
+        # Walls and top furniture are y-sorted against the player, so they are only merged into row strips
+        house_top = self.layer_tiles(['HouseWalls', 'HouseFurnitureTop'])
+        for pos, surf in bake_row_strips(house_top, TILE_SIZE):
+            GenericSprite(pos, assets.add_baked(surf), self.all_sprites, LAYERS['main'])
 
         # Fence
-        for x, y, surf in tmx_data.get_layer_by_name('Fence').tiles():
+        for x, y, surf in self.world_map.tiles('Fence'):
             GenericSprite((x*TILE_SIZE, y*TILE_SIZE), surf, [self.all_sprites, self.collision_sprites], LAYERS['main'])
 
-        # Water
-        water_frames = import_images_from_folder('../graphics/water/')
-        for x, y, surf in tmx_data.get_layer_by_name('Water').tiles():
-            Water((x*TILE_SIZE, y*TILE_SIZE), water_frames, self.all_sprites)
+        # Water, animated by one shared clock and drawn below every sprite
+        water_frames = assets.folder('../graphics/water')
+        self.animation_clocks = {'water': AnimationClock(len(water_frames))}
+        water_tiles = [(x, y) for x, y, _ in self.world_map.tiles('Water')]
+        self.water = AnimatedTiles(water_tiles, water_frames, self.animation_clocks['water'], TILE_SIZE)
+        self.all_sprites.add_renderer(LAYERS['water'], self.water)
 
         # WildFlower
-        for obj in tmx_data.get_layer_by_name('Decoration'):
+        for obj in self.world_map.objects('Decoration'):
             WildFlower((obj.x, obj.y), obj.image, [self.all_sprites, self.collision_sprites])
 
         # Trees
-        for obj in tmx_data.get_layer_by_name('Trees'):
+        for obj in self.world_map.objects('Trees'):
             Tree(pos=(obj.x, obj.y),
                  surf=obj.image,
                  groups=[self.all_sprites, self.collision_sprites, self.tree_sprites],
                  name=obj.name,
                  player_add=self.player_add)
 
-        # Collision Tiles
-        for x, y, surf in tmx_data.get_layer_by_name('Collision').tiles():
-            GenericSprite(pos=(x * TILE_SIZE, y * TILE_SIZE),
-                          surf=pygame.Surface((TILE_SIZE, TILE_SIZE)), groups=self.collision_sprites, z=LAYERS['main'])
+        # Collision tiles, merged into as few plain hitboxes as possible
+        collision_tiles = [(x, y) for x, y, _ in self.world_map.tiles('Collision')]
+        tile_hitbox = pygame.Rect(0, 0, TILE_SIZE, TILE_SIZE).inflate(-TILE_SIZE * 0.2, -TILE_SIZE * 0.75)
+        for rect in merge_tiles(collision_tiles):
+            self.collision_sprites.add_static(pygame.Rect(rect.x * TILE_SIZE + tile_hitbox.x,
+                                                          rect.y * TILE_SIZE + tile_hitbox.y,
+                                                          rect.width * TILE_SIZE - (TILE_SIZE - tile_hitbox.width),
+                                                          rect.height * TILE_SIZE - (TILE_SIZE - tile_hitbox.height)))
 
         # Player / Interactables
-        for obj in tmx_data.get_layer_by_name('Player'):
+        for obj in self.world_map.objects('Player'):
             if obj.name == 'Start':
                 self.player = Player(pos=(obj.x, obj.y),
                                      group=self.all_sprites,
@@ -101,13 +132,18 @@ class Level:
 
         # Ground
         GenericSprite(pos=pygame.math.Vector2(0, 0),
-                      surf=pygame.image.load('../graphics/world/ground.png').convert_alpha(),
+                      surf=assets.image('../graphics/world/ground.png'),
                       groups=self.all_sprites,
                       z=LAYERS['ground'])
 
+    def layer_tiles(self, layers: list[str]) -> list[tuple[int, int, pygame.Surface]]:
+        return [(x * TILE_SIZE, y * TILE_SIZE, surf)
+                for layer in layers
+                for x, y, surf in self.world_map.tiles(layer)]
+
     def player_add(self, item: str, amount: int = 1):
         self.player.item_inventory[item] += amount
-        self.success.play()
+        audio.play(self.success)
         if DEBUG:
             print(self.player.item_inventory)
 
@@ -136,41 +172,86 @@ class Level:
         self.sky.reset_start_color()
 
     def plant_collision(self):
-        if self.soil_layer.plant_sprites.sprites():
-            for plant in self.soil_layer.plant_sprites.sprites():
-                if plant.harvestable and plant.rect.colliderect(self.player.hitbox):
-                    self.player_add(plant.plant_type)
-                    plant.kill()
-                    Particle(pos=plant.rect.topleft, surf=plant.image, groups=self.all_sprites, z=LAYERS['main'])
-                    row = plant.rect.centery // TILE_SIZE
-                    col = plant.rect.centerx // TILE_SIZE
-                    self.soil_layer.grid[row][col].remove('P')
-
-    def run(self, dt) -> None:
+        for plant in self.soil_layer.harvestable_plants(self.player.hitbox):
+            self.player_add(plant.plant_type)
+            self.soil_layer.harvest(plant)
+            Particle.spawn(pos=plant.rect.topleft, surf=plant.image, groups=self.all_sprites, z=LAYERS['main'])
+
+    def find_dirty_rects(self) -> Optional[list[pygame.Rect]]:
+        """Screen areas that need redrawing this frame, or None if the whole screen does."""
+        changed_rects = self.all_sprites.changed_rects()
+        tint_color = self.tint.color()
+        full_redraw = (self.all_sprites.offset != self.last_offset
+                       or tint_color != self.last_tint_color
+                       or self.player.sleep
+                       or profiler.overlay_visible
+                       or DEBUG)
+        self.last_offset.update(self.all_sprites.offset)
+        self.last_tint_color = tint_color
+        if full_redraw:
+            return None
+
+        changed_rects.append(self.overlay.area)
+        if self.shop_active or self.menu_drawn:
+            changed_rects.append(self.menu.area)
+
+        dirty_rects = merge_rects(changed_rects, self.display_surface.get_rect())
+        dirty_area = sum(rect.width * rect.height for rect in dirty_rects)
+        if len(dirty_rects) > DIRTY_RECT_LIMIT or dirty_area > SCREEN_WIDTH * SCREEN_HEIGHT * DIRTY_AREA_LIMIT:
+            return None
+        return dirty_rects
+
+    def run(self, dt) -> Optional[list[pygame.Rect]]:
+        self.sky.update(dt)
+        self.all_sprites.prepare_frame(self.player)
+        dirty_rects = self.find_dirty_rects() if DIRTY_RECTS else None
+
         # Drawing
-        self.display_surface.fill('black')
-        self.all_sprites.custom_draw(self.player)
+        with profiler.section('draw'):
+            if dirty_rects is None:
+                self.display_surface.fill('black')
+            else:
+                for rect in dirty_rects:
+                    self.display_surface.fill('black', rect)
+            self.all_sprites.custom_draw(self.player, dirty_rects)
         # self.all_sprites.update(dt)
+        if TINT_WORLD_ONLY:
+            self.tint.apply(dirty_rects)
 
         # Update
+        self.menu_drawn = self.shop_active
         if self.shop_active:
-            self.menu.update()
+            with profiler.section('menu'):
+                self.menu.update()
         else:
-            self.plant_collision()
-            self.all_sprites.update(dt)
+            with profiler.section('plant collision'):
+                self.plant_collision()
+            with profiler.section('update'):
+                self.all_sprites.update(dt)
+                for clock in self.animation_clocks.values():
+                    clock.update(dt)
+            self.rain.update(dt, self.all_sprites.camera_rect(), spawn=self.raining)
         
         # Overlay
         self.overlay.display()
 
-        # Weather
-        if self.raining and not self.shop_active:
-            self.rain.update()
-
-        # Transition
-        self.sky.display(dt)
+        # Sleep transition and sky tint
         if self.player.sleep:
-            self.transition.play()
-        
+            with profiler.section('transition'):
+                self.transition.play()
+        if not TINT_WORLD_ONLY:
+            self.tint.apply(dirty_rects)
+
+        profiler.end_frame({
+            'all_sprites': len(self.all_sprites),
+            'collision_sprites': len(self.collision_sprites),
+            'plant_sprites': len(self.soil_layer.plant_sprites),
+            'water_sprites': len(self.soil_layer.water_sprites),
+            'rain_particles': self.rain.floor.count + self.rain.drops.count,
+            **assets.stats(),
+        })
+        profiler.display()
+        return dirty_rects
 
 
 class CameraGroup(pygame.sprite.Group):
@@ -179,23 +260,162 @@ class CameraGroup(pygame.sprite.Group):
         self.display_surface = pygame.display.get_surface()
         self.offset = pygame.math.Vector2()
 
-    def custom_draw(self, player):
+        # Render queue: a y-sorted bucket per layer and culling cell, so drawing only walks the visible cells.
+        # Sprites with the same y keep the order they entered their layer in.
+        self.layers = sorted(LAYERS.values())
+        self.sprite_layers = {}
+        self.layer_entries = {}
+        self.entry_counter = count()
+        self.buckets = {}
+        self.unsorted_buckets = set()
+        self.new_sprites = []
+
+        # Culling: world-space index of sprite rects, kept current for sprites that can move
+        self.spatial_index = SpatialHash(CAMERA_CELL_SIZE)
+        self.indexed_rects = {}
+        self.dynamic_sprites = set()
+
+        # Dirty rects: image and screen rect of each sprite as of the last changed_rects() call
+        self.drawn = {}
+
+        # Non-sprite drawing per layer, e.g. particle systems, drawn after the layer's sprites
+        self.renderers = {}
+
+    def add_renderer(self, layer: int, renderer) -> None:
+        """Draw renderer with the given layer. It needs draw(surface, offset, areas), drawing only inside areas unless
+        they are None and returning the number of blits, and changed_rects(offset), returning the screen rects it changed
+        since the previous call."""
+        self.renderers.setdefault(layer, []).append(renderer)
+
+    def add_internal(self, sprite, layer=None) -> None:
+        super().add_internal(sprite, layer)
+        # Sprites usually set their z after joining their groups, so placing them waits until the next draw
+        self.new_sprites.append(sprite)
+
+    def remove_internal(self, sprite) -> None:
+        super().remove_internal(sprite)
+        if sprite in self.sprite_layers:
+            self.unbucket(sprite)
+            self.sprite_layers.pop(sprite)
+            self.layer_entries.pop(sprite)
+            self.indexed_rects.pop(sprite)
+            self.dynamic_sprites.discard(sprite)
+
+    def place(self, sprite) -> None:
+        """Index a sprite at its current rect and add it to the bucket of its layer in each of its cells."""
+        layer = self.sprite_layers[sprite]
+        self.spatial_index.insert(sprite, sprite.rect)
+        self.indexed_rects[sprite] = sprite.rect.copy()
+        for cell in self.spatial_index.item_cells[sprite]:
+            self.buckets.setdefault((layer, cell), []).append(sprite)
+            self.unsorted_buckets.add((layer, cell))
+
+    def unbucket(self, sprite) -> None:
+        layer = self.sprite_layers[sprite]
+        for cell in self.spatial_index.item_cells[sprite]:
+            bucket = self.buckets[(layer, cell)]
+            bucket.remove(sprite)
+            if not bucket:
+                del self.buckets[(layer, cell)]
+        self.spatial_index.remove(sprite)
+
+    def refresh(self, sprite) -> None:
+        """Re-bucket a sprite whose z or cells changed, or mark its buckets for re-sorting when only its y changed."""
+        if sprite in self.indexed_rects:
+            layer = self.sprite_layers[sprite]
+            if sprite.z != layer or self.spatial_index.cells_for(sprite.rect) != self.spatial_index.item_cells[sprite]:
+                self.unbucket(sprite)
+                if sprite.z != layer:
+                    self.move_to_layer(sprite, sprite.z)
+                self.place(sprite)
+            else:
+                if sprite.rect.y != self.indexed_rects[sprite].y:
+                    self.unsorted_buckets.update((layer, cell) for cell in self.spatial_index.item_cells[sprite])
+                self.indexed_rects[sprite] = sprite.rect.copy()
+
+    def move_to_layer(self, sprite, layer: int) -> None:
+        self.sprite_layers[sprite] = layer
+        self.layer_entries[sprite] = next(self.entry_counter)
+
+    def sort_key(self, sprite) -> tuple[int, int]:
+        return sprite.rect.y, self.layer_entries[sprite]
+
+    def prepare_frame(self, player) -> None:
         self.offset.x = player.rect.centerx - SCREEN_WIDTH / 2
         self.offset.y = player.rect.centery - SCREEN_HEIGHT / 2
 
-        for layer in LAYERS.values():
-            sprites_to_draw = [sprite for sprite in sorted(self.sprites(), key=lambda sprite: sprite.rect.y) if sprite.z == layer]
-            for sprite in sprites_to_draw:
-                offset_rect = sprite.rect.copy()
-                offset_rect.center -= self.offset
-                self.display_surface.blit(sprite.image, offset_rect)
-
-                if DEBUG:
-                    # Debug stuff
-                    if sprite == player:
-                        pygame.draw.rect(self.display_surface, 'red', offset_rect, 5)
-                        hitbox_rect = player.hitbox.copy()
-                        hitbox_rect.center = offset_rect.center
-                        pygame.draw.rect(self.display_surface, 'green', hitbox_rect, 5)
-                        target_pos = offset_rect.center + PLAYER_TOOL_OFFSET[player.status.split('_')[0]]
-                        pygame.draw.circle(self.display_surface, 'blue', target_pos, 5)
+        # Bucket new sprites
+        for sprite in self.new_sprites:
+            if self.has_internal(sprite) and sprite not in self.sprite_layers:
+                self.move_to_layer(sprite, sprite.z)
+                self.place(sprite)
+                if type(sprite).update is not pygame.sprite.Sprite.update:
+                    self.dynamic_sprites.add(sprite)
+        self.new_sprites.clear()
+
+        # Follow sprites that moved, changed size or changed z in their update(), static ones call refresh() themselves
+        for sprite in self.dynamic_sprites:
+            if sprite.rect != self.indexed_rects[sprite] or sprite.z != self.sprite_layers[sprite]:
+                self.refresh(sprite)
+
+        # Re-sort only the buckets that changed; timsort is close to linear on nearly sorted buckets
+        for key in self.unsorted_buckets:
+            bucket = self.buckets.get(key)
+            if bucket:
+                bucket.sort(key=self.sort_key)
+        self.unsorted_buckets.clear()
+
+    def camera_rect(self) -> pygame.Rect:
+        return pygame.Rect(self.offset.x, self.offset.y, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    def screen_rect(self, sprite) -> pygame.Rect:
+        offset_rect = sprite.rect.copy()
+        offset_rect.center -= self.offset
+        return offset_rect
+
+    def changed_rects(self) -> list[pygame.Rect]:
+        """Screen rects of sprites that appeared, vanished, moved or changed image since the previous call."""
+        drawn = {sprite: (sprite.image, self.screen_rect(sprite)) for sprite in self.spatial_index.query(self.camera_rect())}
+        rects = []
+        for sprite, (image, rect) in drawn.items():
+            previous = self.drawn.get(sprite)
+            if previous is None:
+                rects.append(rect)
+            elif previous[0] is not image or previous[1] != rect:
+                rects.append(rect)
+                rects.append(previous[1])
+        for sprite, (_, rect) in self.drawn.items():
+            if sprite not in drawn:
+                rects.append(rect)
+        self.drawn = drawn
+
+        for renderers in self.renderers.values():
+            for renderer in renderers:
+                rects += renderer.changed_rects(self.offset)
+        return rects
+
+    def custom_draw(self, player, areas: Optional[list[pygame.Rect]] = None):
+        """Draw the visible sprites, or only the parts of them inside the given non-overlapping screen areas."""
+        query_rects = [self.camera_rect()] if areas is None else [area.move(self.offset) for area in areas]
+        cells = list(dict.fromkeys(cell for rect in query_rects for cell in self.spatial_index.cells_for(rect)))
+        for layer in self.layers:
+            # The visible buckets are sorted runs, timsort merges them in about linear time. A sprite spanning several
+            # cells is in several runs, the copies are dropped first, which keeps every run sorted.
+            runs = [self.buckets[(layer, cell)] for cell in cells if (layer, cell) in self.buckets]
+            sprites = runs[0] if len(runs) == 1 else sorted(dict.fromkeys(chain.from_iterable(runs)), key=self.sort_key)
+            profiler.count_blits(len(sprites))
+            blits = [(sprite.image, self.screen_rect(sprite).topleft) for sprite in sprites]
+            self.display_surface.blits(clip_blits(blits, areas), doreturn=False)
+
+            if DEBUG and player in sprites:
+                # Debug stuff
+                offset_rect = self.screen_rect(player)
+                pygame.draw.rect(self.display_surface, 'red', offset_rect, 5)
+                hitbox_rect = player.hitbox.copy()
+                hitbox_rect.center = offset_rect.center
+                pygame.draw.rect(self.display_surface, 'green', hitbox_rect, 5)
+                target_pos = offset_rect.center + PLAYER_TOOL_OFFSET[player.status.split('_')[0]]
+                pygame.draw.circle(self.display_surface, 'blue', target_pos, 5)
+
+            for renderer in self.renderers.get(layer, []):
+                profiler.count_blits(renderer.draw(self.display_surface, self.offset, areas))
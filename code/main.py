@@ -1,42 +1,79 @@
-import os
 import sys
 
+# Imported first so the startup clock covers every other import
+from startup import startup
+
 import pygame
 
-from level import Level
-from settings import SCREEN_WIDTH, SCREEN_HEIGHT
+from assets import assets
+from level import Level, PRELOAD_FOLDERS, PRELOAD_IMAGES, PRELOAD_SOUNDS
+from profiler import profiler
+from settings import SCREEN_WIDTH, SCREEN_HEIGHT, PROFILE, STARTUP_LOG
+from world import tileset_images
 
 
 class Game:
     def __init__(self):
-        pygame.init()
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        pygame.display.set_caption('pydew')
+        startup.add('import', startup.elapsed())
+        with startup.phase('pygame.init'):
+            pygame.init()
+        with startup.phase('display'):
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            pygame.display.set_caption('pydew')
         self.clock = pygame.time.Clock()
-        self.level = Level()
+        self.level = self.load()
+
+    def load(self) -> Level:
+        """Decode the level's assets in the background while showing a progress bar, then build the level."""
+        font = assets.font('../font/LycheeSoda.ttf', 30)
+        with startup.phase('preload'):
+            for progress in assets.preload(PRELOAD_FOLDERS, PRELOAD_IMAGES + tileset_images(), PRELOAD_SOUNDS):
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        self.quit()
+                self.draw_loading_screen(font, progress)
+        with startup.phase('level'):
+            return Level()
+
+    def draw_loading_screen(self, font: pygame.font.Font, progress: float) -> None:
+        self.screen.fill('Black')
+        bar = pygame.Rect(0, 0, 400, 20)
+        bar.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        pygame.draw.rect(self.screen, 'White', (bar.left, bar.top, bar.width * progress, bar.height))
+        pygame.draw.rect(self.screen, 'White', bar, 2)
+        text_surf = font.render('Loading', False, 'White')
+        self.screen.blit(text_surf, text_surf.get_rect(midbottom=(bar.centerx, bar.top - 10)))
+        pygame.display.update()
+
+    @staticmethod
+    def quit() -> None:
+        profiler.close()
+        pygame.quit()
+        sys.exit(0)
 
     def run(self) -> None:
+        with startup.phase('first frame'):
+            self.frame()
+        startup.finish(STARTUP_LOG if PROFILE else None)
+
         while True:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit(0)
+            self.frame()
+
+    def frame(self) -> None:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.quit()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle_overlay()
 
-            dt = self.clock.tick() / 1000
-            self.level.run(dt)
+        dt = self.clock.tick() / 1000
+        dirty_rects = self.level.run(dt)
+        if dirty_rects is None:
             pygame.display.update()
+        else:
+            pygame.display.update(dirty_rects)
 
 
 if __name__ == '__main__':
-    lines = 0
-    for filename in os.listdir('./'):
-        try:
-            with open(filename) as file:
-                linecount = len(file.readlines())
-                print(filename, linecount)
-                lines += linecount
-        except PermissionError:
-            pass
-    print('Full Linecount:', lines)
     game = Game()
     game.run()
@@ -1,7 +1,9 @@
 import pygame
+from assets import assets
 from player import Player
 from typing import Callable
 from settings import SCREEN_HEIGHT, SCREEN_WIDTH, SALE_PRICES, PURCHASE_PRICES
+from support import get_pressed
 from timer import Timer
 
 class Menu:
@@ -9,7 +11,7 @@ class Menu:
         self.player = player
         self.toggle_menu = toggle_menu
         self.display_surface = pygame.display.get_surface()
-        self.font = pygame.font.Font('../font/LycheeSoda.ttf', 30)
+        self.font = assets.font('../font/LycheeSoda.ttf', 30)
 
         self.options = list(self.player.item_inventory.keys()) + list(self.player.seed_inventory.keys())
         self.sell_border = len(self.player.item_inventory) -1
@@ -24,6 +26,11 @@ class Menu:
         self.menu_left = SCREEN_WIDTH / 2 - self.width / 2
         self.main_rect = pygame.Rect(self.menu_left, self.menu_top, self.width, self.total_height)
 
+        # Screen area covered by the entries and the money display
+        money_rect = pygame.Rect(0, 0, self.width, self.font.get_height() + 10)
+        money_rect.midbottom = (SCREEN_WIDTH / 2, SCREEN_HEIGHT - 45)
+        self.area = self.main_rect.union(money_rect)
+
         self.index = 0
         self.timer = Timer(200)
 
@@ -52,7 +59,7 @@ class Menu:
         return total_height
 
     def input(self) -> None:
-        keys = pygame.key.get_pressed()
+        keys = get_pressed()
         self.timer.update()
 
         if keys[pygame.K_ESCAPE]:
@@ -1,5 +1,6 @@
 import pygame
 
+from assets import assets
 from settings import OVERLAY_POSITIONS
 
 
@@ -11,8 +12,13 @@ class Overlay:
 
         # Import assets
         overlay_path = '../graphics/overlay/'
-        self.tools_surf = {tool: pygame.image.load(f'{overlay_path}{tool}.png').convert_alpha() for tool in player.tools}
-        self.seeds_surf = {seed: pygame.image.load(f'{overlay_path}{seed}.png').convert_alpha() for seed in player.seeds}
+        self.tools_surf = {tool: assets.image(f'{overlay_path}{tool}.png') for tool in player.tools}
+        self.seeds_surf = {seed: assets.image(f'{overlay_path}{seed}.png') for seed in player.seeds}
+
+        # Screen area covered by any tool or seed icon
+        tool_rects = [surf.get_rect(midbottom=OVERLAY_POSITIONS['tool']) for surf in self.tools_surf.values()]
+        seed_rects = [surf.get_rect(midbottom=OVERLAY_POSITIONS['seed']) for surf in self.seeds_surf.values()]
+        self.area = pygame.Rect.unionall(tool_rects[0], tool_rects[1:] + seed_rects)
 
     def display(self):
         # Display equipped tool
@@ -1,15 +1,18 @@
 import pygame
 
+from assets import assets
+from audio import audio
 from settings import LAYERS, PLAYER_TOOL_OFFSET
 from soil import SoilLayer
-from support import import_images_from_folder, increment_and_modulo
+from spatial import SpatialGroup
+from support import increment_and_modulo, get_pressed
 from timer import Timer
 from typing import Callable
 
 
 class Player(pygame.sprite.Sprite):
     def __init__(self, pos: tuple[int, int], group: pygame.sprite.Group, collision_sprites: pygame.sprite.Group,
-                 tree_sprites: pygame.sprite.Group, interactable_sprites: pygame.sprite.Group, soil_layer: SoilLayer,
+                 tree_sprites: SpatialGroup, interactable_sprites: pygame.sprite.Group, soil_layer: SoilLayer,
                  toggle_shop: Callable):
         super().__init__(group)
 
@@ -71,18 +74,16 @@ class Player(pygame.sprite.Sprite):
         self.soil_layer = soil_layer
         self.toggle_shop = toggle_shop
 
-        self.water_sound = pygame.mixer.Sound('../audio/water.mp3')
-        self.water_sound.set_volume(0.01)
+        self.water_sound = assets.sound('../audio/water.mp3', 0.01)
 
     def use_tool(self) -> None:
         if self.selected_tool == 'hoe':
             self.soil_layer.get_hit(self.target_pos)
         if self.selected_tool == 'axe':
-            for tree in self.tree_sprites.sprites():
-                if tree.rect.collidepoint(self.target_pos):
-                    tree.damage()
+            for tree in self.tree_sprites.at(self.target_pos):
+                tree.damage()
         if self.selected_tool == 'water':
-            self.water_sound.play()
+            audio.play(self.water_sound)
             self.soil_layer.water(self.target_pos)
 
     def use_seed(self) -> None:
@@ -103,7 +104,7 @@ class Player(pygame.sprite.Sprite):
 
         for animation in animations:
             full_path = '../graphics/character/' + animation
-            animations[animation] = import_images_from_folder(full_path)
+            animations[animation] = assets.folder(full_path)
         return animations
 
     def animate(self, dt: float) -> None:
@@ -114,7 +115,7 @@ class Player(pygame.sprite.Sprite):
         self.image = self.animations[self.status][int(self.frame_index)]
 
     def input(self) -> None:
-        keys = pygame.key.get_pressed()
+        keys = get_pressed()
 
         if not self.timers['tool use'].active and not self.sleep:
             # Vertical movement
@@ -182,23 +183,22 @@ class Player(pygame.sprite.Sprite):
             timer.update()
 
     def collision(self, direction: str) -> None:
-        for sprite in self.collision_sprites.sprites():
-            if hasattr(sprite, 'hitbox'):
-                if sprite.hitbox.colliderect(self.hitbox):
-                    if direction == 'horizontal':
-                        if self.direction.x > 0:  # moving right
-                            self.hitbox.right = sprite.hitbox.left
-                        if self.direction.x < 0:  # moving left
-                            self.hitbox.left = sprite.hitbox.right
-                        self.rect.centerx = self.hitbox.centerx
-                        self.pos.x = self.hitbox.centerx
-                    if direction == 'vertical':
-                        if self.direction.y > 0:  # moving down
-                            self.hitbox.bottom = sprite.hitbox.top
-                        if self.direction.y < 0:  # moving up
-                            self.hitbox.top = sprite.hitbox.bottom
-                        self.rect.centery = self.hitbox.centery
-                        self.pos.y = self.hitbox.centery
+        for hitbox in self.collision_sprites.hitboxes_near(self.hitbox):
+            if hitbox.colliderect(self.hitbox):
+                if direction == 'horizontal':
+                    if self.direction.x > 0:  # moving right
+                        self.hitbox.right = hitbox.left
+                    if self.direction.x < 0:  # moving left
+                        self.hitbox.left = hitbox.right
+                    self.rect.centerx = self.hitbox.centerx
+                    self.pos.x = self.hitbox.centerx
+                if direction == 'vertical':
+                    if self.direction.y > 0:  # moving down
+                        self.hitbox.bottom = hitbox.top
+                    if self.direction.y < 0:  # moving up
+                        self.hitbox.top = hitbox.bottom
+                    self.rect.centery = self.hitbox.centery
+                    self.pos.y = self.hitbox.centery
 
     def move(self, dt: float) -> None:
         # Normalize the vector
@@ -0,0 +1,161 @@
+import csv
+import json
+import time
+from collections import defaultdict, deque
+from functools import wraps
+from typing import Callable, Optional
+
+import pygame
+
+from assets import assets
+from settings import PROFILE, PROFILE_HISTORY, PROFILE_LOG
+
+
+class Section:
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *_) -> None:
+        self.profiler.frame_timings[self.name] += time.perf_counter() - self.start
+
+
+class NullSection:
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *_) -> None:
+        pass
+
+
+class Profiler:
+    def __init__(self, enabled: bool = PROFILE, history: int = PROFILE_HISTORY, log_path: Optional[str] = PROFILE_LOG):
+        self.enabled = enabled
+        self.null_section = NullSection()
+
+        # Current frame
+        self.frame_timings = defaultdict(float)
+        self.blits = 0
+        self.frame_start = time.perf_counter()
+        self.frame_index = 0
+
+        # Rolling history
+        self.timings = defaultdict(lambda: deque(maxlen=history))
+        self.frame_times = deque(maxlen=history)
+        self.counts = {}
+
+        # Output
+        self.log_path = log_path
+        self.log_file = None
+        self.csv_writer = None
+        self.overlay_visible = False
+        self.font = None
+
+    def section(self, name: str):
+        """Context manager adding the time spent inside it to the named subsystem for this frame."""
+        if not self.enabled:
+            return self.null_section
+        return Section(self, name)
+
+    def timed(self, name: str) -> Callable:
+        """Decorator form of section()."""
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.section(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count_blits(self, amount: int) -> None:
+        self.blits += amount
+
+    def toggle_overlay(self) -> None:
+        self.overlay_visible = not self.overlay_visible and self.enabled
+
+    def end_frame(self, counts: dict[str, int]) -> None:
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        frame_time = now - self.frame_start
+        self.frame_start = now
+
+        self.frame_times.append(frame_time)
+        for name, seconds in self.frame_timings.items():
+            self.timings[name].append(seconds)
+        self.counts = dict(counts, blits=self.blits)
+        if self.log_path:
+            self.write_record(frame_time)
+
+        self.frame_timings = defaultdict(float)
+        self.blits = 0
+        self.frame_index += 1
+
+    def record(self, frame_time: float) -> dict:
+        record = {'frame time': round(frame_time * 1000, 3)}
+        record.update({name: round(seconds * 1000, 3) for name, seconds in self.frame_timings.items()})
+        record.update(self.counts)
+        return record
+
+    def write_record(self, frame_time: float) -> None:
+        record = self.record(frame_time)
+        if self.log_file is None:
+            self.log_file = open(self.log_path, 'w', newline='')
+        if self.log_path.endswith('.csv'):
+            # One row per value, since subsystems only report in the frames they run
+            if self.csv_writer is None:
+                self.csv_writer = csv.writer(self.log_file)
+                self.csv_writer.writerow(['frame', 'name', 'value'])
+            self.csv_writer.writerows([self.frame_index, name, value] for name, value in record.items())
+        else:
+            self.log_file.write(json.dumps(dict(index=self.frame_index, **record)) + '\n')
+
+    def close(self) -> None:
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+            self.csv_writer = None
+
+    def display(self) -> None:
+        if not self.overlay_visible or not self.frame_times:
+            return
+
+        surface = pygame.display.get_surface()
+        if self.font is None:
+            self.font = assets.font('../font/LycheeSoda.ttf', 20)
+
+        # Text: rolling average per subsystem, then the latest counts
+        lines = [f'frame {average_ms(self.frame_times):.2f} ms']
+        lines += [f'{name} {average_ms(samples):.2f} ms' for name, samples in self.timings.items()]
+        lines += [f'{name} {count}' for name, count in self.counts.items()]
+        text_surfs = [self.font.render(line, False, 'White') for line in lines]
+        width = max(text_surf.get_width() for text_surf in text_surfs) + 20
+        height = sum(text_surf.get_height() for text_surf in text_surfs) + 20
+        panel = pygame.Rect(10, 10, max(width, self.frame_times.maxlen * 2 + 20), height + 80)
+        pygame.draw.rect(surface, 'Black', panel)
+
+        top = panel.top + 10
+        for text_surf in text_surfs:
+            surface.blit(text_surf, (panel.left + 10, top))
+            top += text_surf.get_height()
+
+        # Graph: one bar per frame, 1 px per ms, with a line at 60 fps
+        graph_bottom = panel.bottom - 10
+        for index, frame_time in enumerate(self.frame_times):
+            bar_height = min(frame_time * 1000, 60)
+            bar = pygame.Rect(panel.left + 10 + index * 2, graph_bottom - bar_height, 2, bar_height)
+            pygame.draw.rect(surface, 'Green' if frame_time < 1 / 60 else 'Red', bar)
+        target_y = graph_bottom - 1000 / 60
+        pygame.draw.line(surface, 'White', (panel.left + 10, target_y), (panel.right - 10, target_y))
+
+
+def average_ms(samples: deque) -> float:
+    return sum(samples) / len(samples) * 1000
+
+
+profiler = Profiler()
@@ -3,6 +3,8 @@ from pygame.math import Vector2
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
 TILE_SIZE = 64
+CAMERA_CELL_SIZE = TILE_SIZE * 4
+CHUNK_SIZE = 512
 
 OVERLAY_POSITIONS = {
 	'tool': (35, SCREEN_HEIGHT - 15),
@@ -50,4 +52,40 @@ PURCHASE_PRICES = {
 	'tomato': 5
 }
 
+# Rain particles: drops per second over the whole map per layer, pool size per layer, lifetime in ms, speed in px/s
+RAIN_SPAWN_RATE = 60
+RAIN_CAPACITY = 128
+RAIN_LIFETIME = (400, 500)
+RAIN_SPEED = (200, 250)
+RAIN_DIRECTION = Vector2(-2, 4)
+
+# Hit-flash silhouettes kept for particles, and expired particles kept for reuse
+FLASH_CACHE_SIZE = 32
+PARTICLE_POOL_SIZE = 16
+
+# Volume per group, times each sound's own volume
+AUDIO_VOLUMES = {
+	'music': 1.0,
+	'sfx': 1.0
+}
+# Mixer channels for sound effects, and how many of them one sound may use at once
+SFX_CHANNELS = 8
+SFX_INSTANCES = 2
+
 DEBUG = False
+
+# Per-subsystem frame timings, shown with F3 and streamed to PROFILE_LOG (.csv, otherwise JSON lines)
+PROFILE = DEBUG
+PROFILE_HISTORY = 120
+PROFILE_LOG = 'profile.jsonl'
+# Startup phase timings, printed and written to STARTUP_LOG when profiling, the benchmark fails above the budget
+STARTUP_LOG = 'startup.json'
+STARTUP_BUDGET = 3.0
+
+# Only redraw the changed parts of the screen while the camera stands still
+DIRTY_RECTS = False
+DIRTY_RECT_LIMIT = 32
+DIRTY_AREA_LIMIT = 0.5
+
+# Tint only the world with the sky and sleep colours, before the overlay and shop menu are drawn on top
+TINT_WORLD_ONLY = False
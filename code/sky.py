@@ -1,76 +1,119 @@
-import random
-from random import randint
+from array import array
+from random import randint, randrange
+from typing import Optional
 
 import pygame
 
-from settings import LAYERS, SCREEN_HEIGHT, SCREEN_WIDTH
-from sprites import GenericSprite
-from support import import_images_from_folder
+from assets import assets
+from profiler import profiler
+from settings import RAIN_CAPACITY, RAIN_DIRECTION, RAIN_LIFETIME, RAIN_SPAWN_RATE, RAIN_SPEED
+from support import clip_blits
+from world import WorldMap
 
 
 class Sky:
     def __init__(self):
-        self.display_surface = pygame.display.get_surface()
-        self.full_surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
         self.start_color = [255, 255, 255]
         self.end_color = (38, 101, 189)
 
-    def display(self, dt):
+    def update(self, dt):
         for index, value in enumerate(self.end_color):
             if self.start_color[index] > value:
                 self.start_color[index] -= 2 * dt
-        self.full_surf.fill(self.start_color)
-        self.display_surface.blit(self.full_surf, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+
+    def color(self) -> tuple[int, int, int]:
+        return pygame.Color(self.start_color)[:3]
 
     def reset_start_color(self):
         self.start_color = [255, 255, 255]
 
 
-class Drop(GenericSprite):
-    def __init__(self, surf, pos, moving, groups, z):
-        super().__init__(pos, surf, groups, z)
-
-        # Animation attributes
-        self.lifetime = randint(400, 500)
-        self.start_time = pygame.time.get_ticks()
-        self.moving = moving
-        if self.moving:
-            self.pos = pygame.math.Vector2(self.rect.topleft)
-            self.direction = pygame.math.Vector2(-2, 4)
-            self.speed = randint(200, 250)
+class RainLayer:
+    """Fixed-capacity pool of rain particles of one kind, kept in flat arrays and drawn with one blits call.
 
-    def update(self, dt):
-        if self.moving:
-            self.pos += self.direction * self.speed * dt
-            self.rect.topleft = (round(self.pos.x), round(self.pos.y))
+    Live particles are packed at the start of the arrays, an expired one is replaced by the last live one.
+    """
 
-        curr_time = pygame.time.get_ticks()
-        if curr_time - self.start_time > self.lifetime:
-            self.kill()
+    def __init__(self, surfs: list[pygame.Surface], capacity: int, moving: bool):
+        self.surfs = surfs
+        self.capacity = capacity
+        self.moving = moving
+        self.spawn_debt = 0.0
+
+        self.count = 0
+        self.x = array('d', bytes(capacity * 8))
+        self.y = array('d', bytes(capacity * 8))
+        self.speed = array('d', bytes(capacity * 8))
+        self.life = array('d', bytes(capacity * 8))
+        self.image = bytearray(capacity)
+
+        # Screen rects as of the last changed_rects() call
+        self.drawn_rects = []
+
+    def spawn(self, x: int, y: int) -> None:
+        if self.count == self.capacity:
+            return
+        index = self.count
+        self.x[index] = x
+        self.y[index] = y
+        self.speed[index] = randint(*RAIN_SPEED) if self.moving else 0
+        self.life[index] = randint(*RAIN_LIFETIME) / 1000
+        self.image[index] = randrange(len(self.surfs))
+        self.count += 1
+
+    def update(self, dt: float) -> None:
+        x, y, speed, life, image = self.x, self.y, self.speed, self.life, self.image
+        index = 0
+        while index < self.count:
+            life[index] -= dt
+            if life[index] < 0:
+                last = self.count - 1
+                x[index], y[index], speed[index], life[index], image[index] = x[last], y[last], speed[last], life[last], image[last]
+                self.count = last
+                continue
+            if self.moving:
+                x[index] += RAIN_DIRECTION.x * speed[index] * dt
+                y[index] += RAIN_DIRECTION.y * speed[index] * dt
+            index += 1
+
+    def positions(self, offset: pygame.math.Vector2) -> list[tuple[float, float]]:
+        return [(round(self.x[index]) - offset.x, round(self.y[index]) - offset.y) for index in range(self.count)]
+
+    def draw(self, surface: pygame.Surface, offset: pygame.math.Vector2, areas: Optional[list[pygame.Rect]] = None) -> int:
+        surfs = [self.surfs[image] for image in self.image[:self.count]]
+        surface.blits(clip_blits(list(zip(surfs, self.positions(offset))), areas), doreturn=False)
+        return self.count
+
+    def changed_rects(self, offset: pygame.math.Vector2) -> list[pygame.Rect]:
+        """Where particles are now and where they were at the previous call, particles move or expire every frame."""
+        rects = [self.surfs[image].get_rect(topleft=pos) for image, pos in zip(self.image, self.positions(offset))]
+        changed = rects + self.drawn_rects
+        self.drawn_rects = rects
+        return changed
 
 
 class Rain:
-    def __init__(self, all_sprites):
-        self.all_sprites = all_sprites
-        self.rain_drops = import_images_from_folder('../graphics/rain/drops')
-        self.rain_floor = import_images_from_folder('../graphics/rain/floor')
-
-        self.floor_w, self.floor_h = pygame.image.load('../graphics/world/ground.png').get_size()
-
-    def create_floor(self):
-        Drop(surf=random.choice(self.rain_floor),
-             pos=(randint(0, self.floor_w), randint(0, self.floor_h)),
-             moving=False,
-             groups=self.all_sprites,
-             z=LAYERS['rain floor'])
-
-    def create_drops(self):
-        Drop(surf=random.choice(self.rain_drops),
-             pos=(randint(0, self.floor_w), randint(0, self.floor_h)),
-             moving=True,
-             groups=self.all_sprites,
-             z=LAYERS['rain drops'])
-
-    def update(self):
-        self.create_drops()
-        self.create_floor()
+    def __init__(self, world_map: WorldMap):
+        self.floor = RainLayer(assets.folder('../graphics/rain/floor'), RAIN_CAPACITY, moving=False)
+        self.drops = RainLayer(assets.folder('../graphics/rain/drops'), RAIN_CAPACITY, moving=True)
+        self.world_rect = pygame.Rect(0, 0, world_map.width, world_map.height)
+
+        # Drops fall this far at most, so they are spawned up to this far away from the view they fall into
+        self.max_fall = RAIN_DIRECTION * RAIN_SPEED[1] * RAIN_LIFETIME[1] / 1000
+
+    @profiler.timed('rain')
+    def update(self, dt: float, camera_rect: pygame.Rect, spawn: bool) -> None:
+        self.floor.update(dt)
+        self.drops.update(dt)
+        if spawn:
+            drop_area = camera_rect.union(camera_rect.move(-self.max_fall))
+            self.spawn(self.floor, camera_rect.clip(self.world_rect), dt)
+            self.spawn(self.drops, drop_area.clip(self.world_rect), dt)
+
+    def spawn(self, layer: RainLayer, area: pygame.Rect, dt: float) -> None:
+        """Spawn at the same density as RAIN_SPAWN_RATE spread over the whole map, but only inside area."""
+        world_area = self.world_rect.width * self.world_rect.height
+        layer.spawn_debt += RAIN_SPAWN_RATE * dt * area.width * area.height / world_area
+        while layer.spawn_debt >= 1:
+            layer.spawn(randint(area.left, area.right), randint(area.top, area.bottom))
+            layer.spawn_debt -= 1
@@ -1,11 +1,16 @@
 import random
-from typing import Union, Callable
+from array import array
+from functools import lru_cache
+from typing import Union
 
 import pygame
-from pytmx.util_pygame import load_pygame
 
+from assets import assets
+from audio import audio
+from profiler import profiler
 from settings import LAYERS, TILE_SIZE, DEBUG, GROW_SPEED
-from support import import_folder_dict, import_images_from_folder
+from spatial import SpatialHash, refresh
+from world import WorldMap
 
 
 class SoilTile(pygame.sprite.Sprite):
@@ -24,202 +29,268 @@ class WaterTile(pygame.sprite.Sprite):
         self.z = LAYERS['soil water']
 
 
+class Crop:
+    """Frames and growth settings shared by every plant of one type."""
+
+    def __init__(self, plant_type: str):
+        self.plant_type = plant_type
+        self.frames = assets.folder(f'../graphics/fruit/{plant_type}')
+        self.max_age = len(self.frames) - 1
+        self.grow_speed = GROW_SPEED[plant_type]
+        self.y_offset = -16 if plant_type == 'corn' else -8
+
+
 class Plant(pygame.sprite.Sprite):
-    def __init__(self, plant_type: str, groups: Union[pygame.sprite.Group, list[pygame.sprite.Group]], soil: pygame.sprite.Sprite, check_watered: Callable):
+    def __init__(self, crop: Crop, groups: Union[pygame.sprite.Group, list[pygame.sprite.Group]], soil: pygame.sprite.Sprite):
         # General setup
         super().__init__(groups)
-        self.plant_type = plant_type
-        self.frames = import_images_from_folder(f'../graphics/fruit/{self.plant_type}')
+        self.crop = crop
+        self.plant_type = crop.plant_type
         self.soil = soil
-        self.check_watered = check_watered
 
-        # Plant growing attributes
-        self.age = 0
-        self.max_age = len(self.frames) - 1
-        self.grow_speed = GROW_SPEED[self.plant_type]
+        # Plant growing attributes, the age itself lives in SoilLayer.crop_ages
+        self.stage = 0
         self.harvestable = False
 
         # Graphics
-        self.image = self.frames[self.age]
-        self.y_offset = -16 if self.plant_type == 'corn' else -8
-        self.rect = self.image.get_rect(midbottom=self.soil.rect.midbottom + pygame.math.Vector2(x=0, y=self.y_offset))
+        self.image = self.crop.frames[self.stage]
+        self.rect = self.image.get_rect(midbottom=self.soil.rect.midbottom + pygame.math.Vector2(x=0, y=self.crop.y_offset))
         self.z = LAYERS['ground plant']
 
-    def grow(self):
-        if self.check_watered(self.rect.center):
-            self.age += self.grow_speed
+    def show_stage(self, stage: int) -> None:
+        self.stage = stage
+        self.z = LAYERS['main']
+        self.image = self.crop.frames[stage]
+        self.rect = self.image.get_rect(midbottom=self.soil.rect.midbottom + pygame.math.Vector2(x=0, y=self.crop.y_offset))
+        self.hitbox = self.rect.copy().inflate((-26, -self.rect.height * 0.4))
+
+
+# Crop types as stored in SoilLayer.crop_types, 0 is an empty tile
+CROP_TYPES = [None] + list(GROW_SPEED)
+
+
+# Soil grid cell flags
+FARMABLE = 1
+TILLED = 2
+WATERED = 4
+PLANTED = 8
+
+
+# Autotiling: neighbour offsets by mask bit, and the soil graphic for each 4-bit neighbour mask
+NEIGHBOUR_BITS = {1: (0, -1), 2: (1, 0), 4: (0, 1), 8: (-1, 0)}
+SOIL_TILES = {
+    0: 'o', 1: 'b', 2: 'l', 3: 'bl', 4: 't', 5: 'tb', 6: 'tl', 7: 'tbr',
+    8: 'r', 9: 'br', 10: 'lr', 11: 'lrb', 12: 'tr', 13: 'tbl', 14: 'lrt', 15: 'x',
+}
+
+
+@lru_cache
+def match_table(required: int, excluded: int) -> bytes:
+    """Translation table mapping a cell value to 1 if it has all required flags and none of the excluded ones."""
+    return bytes(int(value & required == required and not value & excluded) for value in range(256))
+
+
+@lru_cache
+def clear_table(flags: int) -> bytes:
+    return bytes(value & ~flags for value in range(256))
 
-            if int(self.age) > 0:
-                self.z = LAYERS['main']
-                self.hitbox = self.rect.copy().inflate((-26, -self.rect.height * 0.4))
-            if self.age > self.max_age:
-                self.age = self.max_age
-                self.harvestable = True
 
-            self.image = self.frames[int(self.age)]
-            self.rect = self.image.get_rect(midbottom=self.soil.rect.midbottom + pygame.math.Vector2(x=0, y=self.y_offset))
+class SoilGrid:
+    """One byte of flags per tile, stored row by row."""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.cells = bytearray(width * height)
+
+    def has(self, x: int, y: int, flag: int) -> bool:
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return bool(self.cells[y * self.width + x] & flag)
+        return False
+
+    def set(self, x: int, y: int, flag: int) -> None:
+        self.cells[y * self.width + x] |= flag
+
+    def clear(self, x: int, y: int, flag: int) -> None:
+        self.cells[y * self.width + x] &= ~flag
+
+    def clear_all(self, flag: int) -> None:
+        self.cells = self.cells.translate(clear_table(flag))
+
+    def indices(self, required: int, excluded: int = 0) -> list[int]:
+        """Cell indices with all required flags and none of the excluded ones."""
+        matches = self.cells.translate(match_table(required, excluded))
+        found = []
+        index = matches.find(1)
+        while index != -1:
+            found.append(index)
+            index = matches.find(1, index + 1)
+        return found
+
+    def find(self, required: int, excluded: int = 0) -> list[tuple[int, int]]:
+        """Tiles with all required flags and none of the excluded ones."""
+        return [(index % self.width, index // self.width) for index in self.indices(required, excluded)]
+
+    def __str__(self) -> str:
+        rows = [self.cells[y * self.width:(y + 1) * self.width] for y in range(self.height)]
+        return '\n'.join(row.hex(' ') for row in rows)
 
 
 class SoilLayer:
-    def __init__(self, all_sprites: pygame.sprite.Group, collision_sprites: pygame.sprite.Group):
+    def __init__(self, all_sprites: pygame.sprite.Group, collision_sprites: pygame.sprite.Group, world_map: WorldMap):
         # Sprite Groups
         self.all_sprites = all_sprites
         self.collision_sprites = collision_sprites
         self.soil_sprites = pygame.sprite.Group()
         self.water_sprites = pygame.sprite.Group()
         self.plant_sprites = pygame.sprite.Group()
+        self.soil_tiles = {}
+
+        # Harvestable plants indexed by the tiles their rect covers
+        self.harvest_index = SpatialHash(TILE_SIZE)
 
         # Graphics
-        self.soil_surfs = import_folder_dict('../graphics/soil')
-        self.water_surfs = import_images_from_folder('../graphics/soil_water')
+        self.soil_surfs = assets.folder_dict('../graphics/soil')
+        self.water_surfs = assets.folder('../graphics/soil_water')
+
+        self.grid = self.create_soil_grid(world_map)
 
-        self.grid = self.create_soil_grid()
-        self.hit_rects = self.create_hit_rects()
+        # Crops, one cell per soil grid cell
+        size = self.grid.width * self.grid.height
+        self.crop_ages = array('d', bytes(size * 8))
+        self.crop_types = bytearray(size)
+        self.plants = {}
 
-        self.hoe_sound = pygame.mixer.Sound('../audio/hoe.wav')
-        self.hoe_sound.set_volume(0.01)
-        self.plant_sound = pygame.mixer.Sound('../audio/plant.wav')
-        self.plant_sound.set_volume(0.01)
+        # Crop graphics are loaded up front so planting never touches the disk
+        self.crops = [None] + [Crop(plant_type) for plant_type in CROP_TYPES[1:]]
+        self.crop_max_ages = [0] + [crop.max_age for crop in self.crops[1:]]
+        self.crop_speeds = [0.0] + [crop.grow_speed for crop in self.crops[1:]]
+
+        self.hoe_sound = assets.sound('../audio/hoe.wav', 0.01)
+        self.plant_sound = assets.sound('../audio/plant.wav', 0.01)
 
         if DEBUG:
-            for row in self.grid:
-                print(row)
-            print(self.hit_rects)
+            print(self.grid)
 
     @staticmethod
-    def create_soil_grid():
-        ground = pygame.image.load('../graphics/world/ground.png')
-        h_tiles = ground.get_width() // TILE_SIZE
-        v_tiles = ground.get_height() // TILE_SIZE
-        grid = [[[] for _ in range(h_tiles)] for __ in range(v_tiles)]
-        for x, y, _ in load_pygame('../data/map.tmx').get_layer_by_name('Farmable').tiles():
-            grid[y][x].append('F')
+    def create_soil_grid(world_map: WorldMap) -> SoilGrid:
+        grid = SoilGrid(world_map.h_tiles, world_map.v_tiles)
+        for x, y, _ in world_map.tiles('Farmable'):
+            grid.set(x, y, FARMABLE)
         return grid
 
-    def create_hit_rects(self) -> list[pygame.Rect]:
-        hit_rects = []
-        for row_index, row in enumerate(self.grid):
-            for col_index, cell in enumerate(row):
-                if 'F' in cell:
-                    x = col_index * TILE_SIZE
-                    y = row_index * TILE_SIZE
-                    rect = pygame.Rect(x, y, TILE_SIZE, TILE_SIZE)
-                    hit_rects.append(rect)
-        return hit_rects
+    @staticmethod
+    def tile_at(pos: Union[pygame.math.Vector2, tuple[int, int]]) -> tuple[int, int]:
+        return int(pos[0] // TILE_SIZE), int(pos[1] // TILE_SIZE)
 
+    @profiler.timed('soil')
     def get_hit(self, target_pos: pygame.math.Vector2) -> None:
-        for rect in self.hit_rects:
-            if rect.collidepoint(target_pos):
-                self.hoe_sound.play()
-                x = rect.x // TILE_SIZE
-                y = rect.y // TILE_SIZE
-                if 'F' in self.grid[y][x]:
-                    self.grid[y][x].append('X')
-                    self.create_soil_tiles()
-                    if self.raining:
-                        self.water_all()
-
+        x, y = self.tile_at(target_pos)
+        if self.grid.has(x, y, FARMABLE):
+            audio.play(self.hoe_sound)
+            if not self.grid.has(x, y, TILLED):
+                self.grid.set(x, y, TILLED)
+                self.update_soil_tile(x, y)
+                for dx, dy in NEIGHBOUR_BITS.values():
+                    self.update_soil_tile(x + dx, y + dy)
+                if self.raining:
+                    self.water_all()
+
+    @profiler.timed('soil')
     def water(self, target_pos: pygame.math.Vector2) -> None:
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(target_pos):
-                x = soil_sprite.rect.x // TILE_SIZE
-                y = soil_sprite.rect.y // TILE_SIZE
-                self.grid[y][x].append('W')
-
-                WaterTile(pos=soil_sprite.rect.topleft, surf=random.choice(self.water_surfs), groups=[self.all_sprites, self.water_sprites])
+        x, y = self.tile_at(target_pos)
+        soil_sprite = self.soil_tiles.get((x, y))
+        if soil_sprite and not self.grid.has(x, y, WATERED):
+            self.grid.set(x, y, WATERED)
+            WaterTile(pos=soil_sprite.rect.topleft, surf=random.choice(self.water_surfs), groups=[self.all_sprites, self.water_sprites])
 
+    @profiler.timed('soil')
     def water_all(self):
-        for row_index, row in enumerate(self.grid):
-            for col_index, cell in enumerate(row):
-                if 'X' in cell and 'W' not in cell:
-                    cell.append('W')
-                    x = col_index * TILE_SIZE
-                    y = row_index * TILE_SIZE
-                    WaterTile(pos=(x, y), surf=random.choice(self.water_surfs), groups=[self.all_sprites, self.water_sprites])
+        for x, y in self.grid.find(TILLED, excluded=WATERED):
+            self.grid.set(x, y, WATERED)
+            WaterTile(pos=(x * TILE_SIZE, y * TILE_SIZE), surf=random.choice(self.water_surfs), groups=[self.all_sprites, self.water_sprites])
 
+    @profiler.timed('soil')
     def remove_water(self) -> None:
         for sprite in self.water_sprites.sprites():
             sprite.kill()
 
-        for row in self.grid:
-            for cell in row:
-                if 'W' in cell:
-                    cell.remove('W')
-
-    def check_watered(self, pos: tuple[int, int]) -> bool:
-        x = pos[0] // TILE_SIZE
-        y = pos[1] // TILE_SIZE
-        cell = self.grid[y][x]
-        return 'W' in cell
+        self.grid.clear_all(WATERED)
 
+    @profiler.timed('soil')
     def plant_seed(self, target_pos: pygame.math.Vector2, selected_seed: str) -> None:
-        for soil_sprite in self.soil_sprites.sprites():
-            if soil_sprite.rect.collidepoint(target_pos):
-                self.plant_sound.play()
-                x = soil_sprite.rect.x // TILE_SIZE
-                y = soil_sprite.rect.y // TILE_SIZE
-                if 'P' not in self.grid[y][x]:
-                    self.grid[y][x].append('P')
-                    Plant(plant_type=selected_seed,
-                          soil=soil_sprite,
-                          groups=[self.all_sprites, self.plant_sprites, self.collision_sprites],
-                          check_watered=self.check_watered)
-
+        x, y = self.tile_at(target_pos)
+        soil_sprite = self.soil_tiles.get((x, y))
+        if soil_sprite:
+            audio.play(self.plant_sound)
+            if not self.grid.has(x, y, PLANTED):
+                self.grid.set(x, y, PLANTED)
+                crop_type = CROP_TYPES.index(selected_seed)
+                plant = Plant(crop=self.crops[crop_type],
+                              soil=soil_sprite,
+                              groups=[self.all_sprites, self.plant_sprites, self.collision_sprites])
+                index = y * self.grid.width + x
+                self.crop_ages[index] = 0
+                self.crop_types[index] = crop_type
+                self.plants[index] = plant
+
+    @profiler.timed('soil')
     def update_plants(self):
-        for plant in self.plant_sprites.sprites():
-            plant.grow()
-
-    def create_soil_tiles(self):
-        self.soil_sprites.empty()
-        for row_index, row in enumerate(self.grid):
-            for col_index, cell in enumerate(row):
-                if 'X' in cell:
-                    top = 'X' in self.grid[row_index-1][col_index]
-                    bottom = 'X' in self.grid[row_index+1][col_index]
-                    left = 'X' in row[col_index-1]
-                    right = 'X' in row[col_index+1]
-
-                    tile_type = 'o'
-
-                    if all([top, bottom, left, right]):
-                        tile_type = 'x'
-
-                    # Horizontals
-                    if left and not any([top, right, bottom]):
-                        tile_type = 'r'
-                    if right and not any([top, left, bottom]):
-                        tile_type = 'l'
-                    if right and left and not any([top, bottom]):
-                        tile_type = 'lr'
-
-                    # Verticals
-                    if top and not any([right, left, bottom]):
-                        tile_type = 'b'
-                    if bottom and not any([right, left, top]):
-                        tile_type = 't'
-                    if bottom and top and not any([right, left]):
-                        tile_type = 'tb'
-
-                    # Corners
-                    if left and bottom and not any([top, right]):
-                        tile_type = 'tr'
-                    if right and bottom and not any([top, left]):
-                        tile_type = 'tl'
-                    if left and top and not any([bottom, right]):
-                        tile_type = 'br'
-                    if right and top and not any([bottom, left]):
-                        tile_type = 'bl'
-
-                    # T shapes
-                    if all([top, bottom, right]) and not left:
-                        tile_type = 'tbr'
-                    if all([top, bottom, left]) and not right:
-                        tile_type = 'tbl'
-                    if all([top, left, right]) and not bottom:
-                        tile_type = 'lrb'
-                    if all([left, bottom, right]) and not top:
-                        tile_type = 'lrt'
-
-                    SoilTile(pos=(col_index*TILE_SIZE, row_index*TILE_SIZE),
-                             surf=self.soil_surfs[tile_type],
-                             groups=[self.all_sprites, self.soil_sprites])
+        """Age every watered crop by a day, then update only the plants whose growth stage changed."""
+        ages = self.crop_ages
+        types = self.crop_types
+        max_ages = self.crop_max_ages
+        speeds = self.crop_speeds
+
+        for index in self.grid.indices(PLANTED | WATERED):
+            old_age = ages[index]
+            age = old_age + speeds[types[index]]
+            max_age = max_ages[types[index]]
+            harvestable = age > max_age
+            if harvestable:
+                age = max_age
+            ages[index] = age
+
+            stage = int(age)
+            if stage == int(old_age) and not harvestable:
+                continue
+            plant = self.plants[index]
+            if stage != plant.stage:
+                plant.show_stage(stage)
+                refresh(plant)
+            if harvestable and not plant.harvestable:
+                plant.harvestable = True
+                self.harvest_index.move(plant, plant.rect)
+
+    def harvestable_plants(self, rect: pygame.Rect) -> list[Plant]:
+        plants = [plant for plant in self.harvest_index.query(rect) if plant.rect.colliderect(rect)]
+        return sorted(plants, key=lambda plant: (plant.rect.y, plant.rect.x))
+
+    def harvest(self, plant: Plant) -> None:
+        plant.kill()
+        self.harvest_index.remove(plant)
+        x = plant.soil.rect.x // TILE_SIZE
+        y = plant.soil.rect.y // TILE_SIZE
+        self.grid.clear(x, y, PLANTED)
+        index = y * self.grid.width + x
+        self.crop_types[index] = 0
+        del self.plants[index]
+
+    def update_soil_tile(self, x: int, y: int) -> None:
+        """Pick the autotile for a tilled tile from its tilled neighbours, creating the sprite if needed."""
+        if not self.grid.has(x, y, TILLED):
+            return
+
+        mask = 0
+        for bit, (dx, dy) in NEIGHBOUR_BITS.items():
+            if self.grid.has(x + dx, y + dy, TILLED):
+                mask |= bit
+        surf = self.soil_surfs[SOIL_TILES[mask]]
+
+        soil_tile = self.soil_tiles.get((x, y))
+        if soil_tile is None:
+            self.soil_tiles[(x, y)] = SoilTile(pos=(x * TILE_SIZE, y * TILE_SIZE),
+                                               surf=surf,
+                                               groups=[self.all_sprites, self.soil_sprites])
+        else:
+            soil_tile.image = surf
@@ -0,0 +1,97 @@
+from collections import defaultdict
+from itertools import count
+from typing import Hashable, Union
+
+import pygame
+
+
+class SpatialHash:
+    def __init__(self, cell_size: int):
+        self.cell_size = cell_size
+        self.cells = defaultdict(set)
+        self.item_cells = {}
+
+    def cells_for(self, rect: pygame.Rect) -> list[tuple[int, int]]:
+        size = self.cell_size
+        left = rect.left // size
+        top = rect.top // size
+        right = max(rect.right - 1, rect.left) // size
+        bottom = max(rect.bottom - 1, rect.top) // size
+        return [(x, y) for x in range(left, right + 1) for y in range(top, bottom + 1)]
+
+    def insert(self, item: Hashable, rect: pygame.Rect) -> None:
+        keys = self.cells_for(rect)
+        for key in keys:
+            self.cells[key].add(item)
+        self.item_cells[item] = keys
+
+    def remove(self, item: Hashable) -> None:
+        for key in self.item_cells.pop(item, ()):
+            cell = self.cells[key]
+            cell.discard(item)
+            if not cell:
+                del self.cells[key]
+
+    def move(self, item: Hashable, rect: pygame.Rect) -> None:
+        if self.cells_for(rect) != self.item_cells.get(item):
+            self.remove(item)
+            self.insert(item, rect)
+
+    def query(self, rect: pygame.Rect) -> set:
+        found = set()
+        for key in self.cells_for(rect):
+            cell = self.cells.get(key)
+            if cell:
+                found.update(cell)
+        return found
+
+
+class SpatialGroup(pygame.sprite.Group):
+    """Sprite group that indexes one rect attribute of its members in a SpatialHash."""
+    rect_attribute = 'rect'
+
+    def __init__(self, cell_size: int):
+        super().__init__()
+        self.index = SpatialHash(cell_size)
+        self.new_sprites = []
+
+        # Query results come back in the order sprites joined, like iterating the group itself
+        self.counter = count()
+        self.order = {}
+
+    def add_internal(self, sprite, layer=None) -> None:
+        super().add_internal(sprite, layer)
+        self.order[sprite] = next(self.counter)
+        # Rects are usually set after the sprite joined its groups, so indexing waits until the next query
+        self.new_sprites.append(sprite)
+
+    def remove_internal(self, sprite) -> None:
+        super().remove_internal(sprite)
+        self.order.pop(sprite, None)
+        self.index.remove(sprite)
+
+    def refresh(self, sprite) -> None:
+        """Re-index a sprite whose rect was created, moved or replaced."""
+        if self.has_internal(sprite):
+            self.index.remove(sprite)
+            if hasattr(sprite, self.rect_attribute):
+                self.index.insert(sprite, getattr(sprite, self.rect_attribute))
+
+    def query(self, rect: pygame.Rect) -> list:
+        """Members, or other indexed items, sharing a cell with rect."""
+        for sprite in self.new_sprites:
+            self.refresh(sprite)
+        self.new_sprites.clear()
+        return sorted(self.index.query(rect), key=self.order.__getitem__)
+
+    def at(self, pos: Union[pygame.math.Vector2, tuple[int, int]]) -> list[pygame.sprite.Sprite]:
+        """Members whose rect contains pos."""
+        candidates = self.query(pygame.Rect(pos, (1, 1)))
+        return [sprite for sprite in candidates if getattr(sprite, self.rect_attribute).collidepoint(pos)]
+
+
+def refresh(sprite: pygame.sprite.Sprite) -> None:
+    """Tell every spatially indexed group holding the sprite that its rect or hitbox changed."""
+    for group in sprite.groups():
+        if hasattr(group, 'refresh'):
+            group.refresh(sprite)
@@ -1,10 +1,14 @@
+from collections import OrderedDict
 from random import randint, choice
 from typing import Union, Callable
 
 import pygame
 
-from settings import LAYERS, APPLE_POS
-from timer import Timer
+from assets import assets
+from audio import audio
+from settings import LAYERS, APPLE_POS, FLASH_CACHE_SIZE, PARTICLE_POOL_SIZE
+from spatial import refresh
+from timer import Timer, get_ticks
 
 
 class GenericSprite(pygame.sprite.Sprite):
@@ -25,30 +29,6 @@ class Interactable(GenericSprite):
         self.name = name
 
 
-class Water(GenericSprite):
-    def __init__(self, pos: Union[pygame.math.Vector2, tuple[int, int]],
-                 frames: list[pygame.Surface], groups: Union[pygame.sprite.Group, list[pygame.sprite.Group]]):
-        # Animation setup
-        self.frames = frames
-        self.frame_index = 0
-
-        # Sprite setup
-        self.z = LAYERS['water']
-        super().__init__(pos=pos,
-                         surf=self.frames[self.frame_index],
-                         groups=groups,
-                         z=self.z)
-
-    def animate(self, dt: float):
-        self.frame_index += 4 * dt
-        if self.frame_index >= len(self.frames):
-            self.frame_index = 0
-        self.image = self.frames[int(self.frame_index)]
-
-    def update(self, dt) -> None:
-        self.animate(dt)
-
-
 class WildFlower(GenericSprite):
     def __init__(self, pos: Union[pygame.math.Vector2, tuple[int, int]],
                  surf: pygame.Surface, groups: Union[pygame.sprite.Group, list[pygame.sprite.Group]]):
@@ -56,37 +36,72 @@ class WildFlower(GenericSprite):
         self.hitbox = self.rect.copy().inflate((-20, -self.rect.height * 0.9))
 
 
+class FlashCache:
+    """White silhouettes of source surfaces, the least recently used one is dropped when the cache is full."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.surfs = OrderedDict()
+
+    def get(self, surf: pygame.Surface) -> pygame.Surface:
+        flash = self.surfs.get(surf)
+        if flash is None:
+            flash = self.surfs[surf] = pygame.mask.from_surface(surf).to_surface()
+            flash.set_colorkey((0, 0, 0))
+            if len(self.surfs) > self.size:
+                self.surfs.popitem(last=False)
+        else:
+            self.surfs.move_to_end(surf)
+        return flash
+
+
 class Particle(GenericSprite):
+    """A short white flash of a surface. Create them with spawn(), which reuses expired particles."""
+
+    flashes = FlashCache(FLASH_CACHE_SIZE)
+    pool = []
+
     def __init__(self, pos, surf, groups, z, duration=200):
-        super().__init__(pos, surf, groups, z)
+        super().__init__(pos, self.flashes.get(surf), groups, z)
         self.duration = duration
-        self.start_time = pygame.time.get_ticks()
-
-        mask_surface = pygame.mask.from_surface(self.image).to_surface()
-        mask_surface.set_colorkey((0, 0, 0))
-        self.image = mask_surface
+        self.start_time = get_ticks()
+
+    @classmethod
+    def spawn(cls, pos, surf, groups, z, duration=200) -> 'Particle':
+        if not cls.pool:
+            return cls(pos, surf, groups, z, duration)
+        particle = cls.pool.pop()
+        particle.image = cls.flashes.get(surf)
+        particle.rect = particle.image.get_rect(topleft=pos)
+        particle.hitbox = particle.rect.copy().inflate(-particle.rect.width * 0.2, -particle.rect.height * 0.75)
+        particle.z = z
+        particle.duration = duration
+        particle.start_time = get_ticks()
+        particle.add(groups)
+        return particle
 
     def update(self, dt):
-        current_time = pygame.time.get_ticks()
+        current_time = get_ticks()
         if current_time - self.start_time > self.duration:
             self.kill()
+            if len(self.pool) < PARTICLE_POOL_SIZE:
+                self.pool.append(self)
 
 
 class Tree(GenericSprite):
     def __init__(self, pos: Union[pygame.math.Vector2, tuple[int, int]], surf: pygame.Surface,
                  groups: Union[pygame.sprite.Group, list[pygame.sprite.Group]], name: str, player_add: Callable):
         super().__init__(pos, surf, groups, LAYERS['main'])
-        self.all_sprites = self.groups()[0]
-        self.axe_sound = pygame.mixer.Sound('../audio/axe.mp3')
-        self.axe_sound.set_volume(0.05)
+        self.all_sprites = groups[0]
+        self.axe_sound = assets.sound('../audio/axe.mp3', 0.05)
 
         # Tree Attributes
         self.health = 5
         self.alive = True
-        self.stump_surf = pygame.image.load(f'../graphics/stumps/{name.lower()}.png').convert_alpha()
+        self.stump_surf = assets.image(f'../graphics/stumps/{name.lower()}.png')
 
         # Apples
-        self.apple_surf = pygame.image.load('../graphics/fruit/apple.png')
+        self.apple_surf = assets.image('../graphics/fruit/apple.png')
         self.apple_pos = APPLE_POS[name]
         self.apple_sprites = pygame.sprite.Group()
         self.create_fruit()
@@ -96,25 +111,26 @@ class Tree(GenericSprite):
     def damage(self):
         self.health -= 1
 
-        self.axe_sound.play()
+        audio.play(self.axe_sound)
 
         # Remove a random apple
         if len(self.apple_sprites.sprites()) > 0:
             random_apple = choice(self.apple_sprites.sprites())
             random_apple.kill()
-            Particle(pos=(random_apple.rect.left,
-                          random_apple.rect.top),
-                     surf=self.apple_surf,
-                     groups=self.all_sprites,
-                     z=LAYERS['fruit'])
+            Particle.spawn(pos=(random_apple.rect.left,
+                                random_apple.rect.top),
+                           surf=self.apple_surf,
+                           groups=self.all_sprites,
+                           z=LAYERS['fruit'])
             self.player_add('apple')
 
     def check_death(self):
         if self.health <= 0:
-            Particle(pos=self.rect.topleft, surf=self.image, groups=self.all_sprites, z=LAYERS['fruit'], duration=250)
+            Particle.spawn(pos=self.rect.topleft, surf=self.image, groups=self.all_sprites, z=LAYERS['fruit'], duration=250)
             self.image = self.stump_surf
             self.rect = self.image.get_rect(midbottom=self.rect.midbottom)
             self.hitbox = self.rect.copy().inflate(-10, -self.rect.height * 0.6)
+            refresh(self)
             self.player_add('wood')
             self.alive = False
 
@@ -0,0 +1,50 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class StartupProfiler:
+    """Wall-clock time of each startup phase, from the first import until the first frame is on screen.
+
+    Phases may nest, e.g. the map parse happens inside the level build, so they don't add up to the total.
+    The clock starts when this module is imported, so entry points import it before anything else.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.total = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def finish(self, log_path: Optional[str] = None) -> None:
+        """Stop the clock, print the breakdown and write it to log_path if given."""
+        self.total = self.elapsed()
+        if log_path:
+            print(self.report())
+            with open(log_path, 'w') as file:
+                json.dump(self.record(), file, indent=2)
+
+    def record(self) -> dict[str, float]:
+        record = {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()}
+        record['total'] = round(self.total * 1000, 3)
+        return record
+
+    def report(self) -> str:
+        return '\n'.join(f'{name:24} {millis:9.1f} ms' for name, millis in self.record().items())
+
+
+startup = StartupProfiler()
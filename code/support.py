@@ -1,28 +1,122 @@
-from os import walk
+from collections import defaultdict
+from typing import Optional
 
 import pygame
 
+# Keyboard state source for Player and Menu, swapped for scripted input by the benchmark
+key_source = pygame.key.get_pressed
 
-def import_images_from_folder(path: str) -> list[pygame.Surface]:
-    surface_list = []
 
-    for _, __, image_files in walk(path):
-        for image in image_files:
-            full_path = path + '/' + image
-            image = pygame.image.load(full_path).convert_alpha()
-            surface_list.append(image)
+def get_pressed() -> pygame.key.ScancodeWrapper:
+    return key_source()
 
-    return surface_list
 
+def bake_chunks(tiles: list[tuple[int, int, pygame.Surface]], chunk_size: int) -> list[tuple[tuple[int, int], pygame.Surface]]:
+    """Composite tiles, given as pixel positions in draw order, into fixed-size chunk surfaces."""
+    chunks = defaultdict(list)
+    for x, y, surf in tiles:
+        chunks[(x // chunk_size, y // chunk_size)].append((x, y, surf))
 
-def import_folder_dict(path: str) -> dict[str: pygame.Surface]:
-    res = {}
-    for _, __, files in walk(path):
-        for filename in files:
-            name = filename.split('.')[0]
-            image = pygame.image.load(path + '/' + filename).convert_alpha()
-            res[name] = image
-    return res
+    baked = []
+    for (chunk_x, chunk_y), chunk_tiles in chunks.items():
+        left = chunk_x * chunk_size
+        top = chunk_y * chunk_size
+        right = max(x + surf.get_width() for x, _, surf in chunk_tiles)
+        bottom = max(y + surf.get_height() for _, y, surf in chunk_tiles)
+        baked.append(((left, top), composite(chunk_tiles, left, top, right - left, bottom - top)))
+    return baked
+
+
+def bake_row_strips(tiles: list[tuple[int, int, pygame.Surface]], tile_size: int) -> list[tuple[tuple[int, int], pygame.Surface]]:
+    """Composite horizontally adjacent tiles of the same row into strips, so they still y-sort like single tiles."""
+    rows = defaultdict(list)
+    for x, y, surf in tiles:
+        rows[y].append((x, y, surf))
+
+    baked = []
+    for y, row_tiles in rows.items():
+        columns = sorted({x for x, _, __ in row_tiles})
+        runs = [[columns[0]]]
+        for x in columns[1:]:
+            if x - runs[-1][-1] == tile_size:
+                runs[-1].append(x)
+            else:
+                runs.append([x])
+
+        for run in runs:
+            left, right = run[0], run[-1]
+            run_tiles = [tile for tile in row_tiles if left <= tile[0] <= right]
+            width = max(x + surf.get_width() for x, _, surf in run_tiles) - left
+            height = max(surf.get_height() for _, __, surf in run_tiles)
+            baked.append(((left, y), composite(run_tiles, left, y, width, height)))
+    return baked
+
+
+def composite(tiles: list[tuple[int, int, pygame.Surface]], left: int, top: int, width: int, height: int) -> pygame.Surface:
+    surf = pygame.Surface((width, height), pygame.SRCALPHA)
+    for x, y, tile in tiles:
+        surf.blit(tile, (x - left, y - top))
+    return surf
+
+
+def merge_tiles(tiles: list[tuple[int, int]]) -> list[pygame.Rect]:
+    """Greedily merge tile coordinates into rects (in tiles): runs along each row, then equal runs down columns."""
+    rows = defaultdict(list)
+    for x, y in tiles:
+        rows[y].append(x)
+
+    merged = []
+    open_rects = {}
+    for y in sorted(rows):
+        columns = sorted(set(rows[y]))
+        runs = []
+        start = columns[0]
+        for previous, x in zip(columns, columns[1:] + [None]):
+            if x != previous + 1:
+                runs.append((start, previous - start + 1))
+                start = x
+
+        # Extend rects from the row above that have exactly the same run, close the others
+        extended = {}
+        for run in runs:
+            rect = open_rects.pop(run, None)
+            if rect is not None and rect.bottom == y:
+                rect.height += 1
+            else:
+                rect = pygame.Rect(run[0], y, run[1], 1)
+                merged.append(rect)
+            extended[run] = rect
+        open_rects = extended
+    return merged
+
+
+def merge_rects(rects: list[pygame.Rect], bounds: pygame.Rect) -> list[pygame.Rect]:
+    """Clip rects to bounds and merge overlapping ones until none of the results overlap."""
+    merged = []
+    for rect in rects:
+        rect = rect.clip(bounds)
+        if not rect.width or not rect.height:
+            continue
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+def clip_blits(blits: list[tuple[pygame.Surface, tuple[float, float]]],
+               areas: Optional[list[pygame.Rect]]) -> list[tuple[pygame.Surface, ...]]:
+    """Limit a blits() sequence to non-overlapping screen areas, each blit becomes one per area it touches."""
+    if areas is None:
+        return blits
+    clipped = []
+    for surf, pos in blits:
+        rect = surf.get_rect(topleft=pos)
+        for index in rect.collidelistall(areas):
+            part = rect.clip(areas[index])
+            clipped.append((surf, part, part.move(-rect.x, -rect.y)))
+    return clipped
 
 
 def increment_and_modulo(x: int, mod: int) -> int:
@@ -2,6 +2,13 @@ from typing import Callable
 
 import pygame
 
+# Time source for timers and timed sprites, swapped for a simulated clock by the benchmark
+clock = pygame.time.get_ticks
+
+
+def get_ticks() -> int:
+    return clock()
+
 
 class Timer:
     def __init__(self, duration: int, func: Callable = None):
@@ -12,14 +19,14 @@ class Timer:
 
     def activate(self) -> None:
         self.active = True
-        self.start_time = pygame.time.get_ticks()
+        self.start_time = get_ticks()
 
     def deactivate(self) -> None:
         self.active = False
         self.start_time = 0
 
     def update(self) -> None:
-        current_time = pygame.time.get_ticks()
+        current_time = get_ticks()
         if current_time - self.start_time >= self.duration:
             if self.func and self.start_time != 0:
                 self.func()
@@ -0,0 +1,48 @@
+from typing import Callable, Optional
+
+import pygame
+
+from profiler import profiler
+from settings import SCREEN_WIDTH, SCREEN_HEIGHT
+
+WHITE = (255, 255, 255)
+
+
+class ScreenTint:
+    """Multiplies the screen by every tint source at once, e.g. the sky and the sleep transition.
+
+    The source colours are combined into one, a white result is skipped, and the fill surface is only refilled when the
+    combined colour changes.
+    """
+
+    def __init__(self):
+        self.display_surface = pygame.display.get_surface()
+        self.surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.surf.fill(WHITE)
+        self.surf_color = WHITE
+        self.sources = []
+
+    def add_source(self, color: Callable[[], tuple[int, int, int]]) -> None:
+        self.sources.append(color)
+
+    def color(self) -> tuple[int, int, int]:
+        r, g, b = WHITE
+        for source in self.sources:
+            source_r, source_g, source_b = source()
+            r, g, b = r * source_r // 255, g * source_g // 255, b * source_b // 255
+        return r, g, b
+
+    @profiler.timed('tint')
+    def apply(self, areas: Optional[list[pygame.Rect]] = None) -> None:
+        color = self.color()
+        if color == WHITE:
+            return
+        if color != self.surf_color:
+            self.surf.fill(color)
+            self.surf_color = color
+
+        if areas is None:
+            self.display_surface.blit(self.surf, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+        else:
+            for area in areas:
+                self.display_surface.blit(self.surf, area, area, special_flags=pygame.BLEND_RGBA_MULT)
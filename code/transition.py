@@ -1,20 +1,16 @@
 from typing import Callable
 
-import pygame
-
 from player import Player
-from settings import SCREEN_WIDTH, SCREEN_HEIGHT
 
 
 class Transition:
+    """Fades to black and back while the player sleeps, the tint is applied by ScreenTint."""
+
     def __init__(self, reset: Callable, player: Player):
         # Setup
-        self.display_surface = pygame.display.get_surface()
         self.reset = reset
         self.player = player
 
-        # Overlay image
-        self.image = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
         self.color = 255
         self.speed = 2
 
@@ -28,5 +24,6 @@ class Transition:
             self.color = 255
             self.player.sleep = False
             self.speed = 2
-        self.image.fill((self.color, self.color, self.color))
-        self.display_surface.blit(self.image, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+
+    def tint(self) -> tuple[int, int, int]:
+        return self.color, self.color, self.color
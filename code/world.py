@@ -0,0 +1,255 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import xml.etree.ElementTree as ElementTree
+from array import array
+from typing import Optional, Union
+
+import pygame
+from pytmx.util_pygame import load_pygame
+
+from assets import assets
+
+MAP_PATH = '../data/map.tmx'
+# Generated next to the map on the first launch after it changes, ignored by git
+MAP_CACHE = '../data/map.cache'
+
+# Cache layout: magic, header length, JSON header, then one native uint32 gid per cell for every tile layer
+CACHE_MAGIC = b'PYDEWMAP'
+CACHE_VERSION = 2
+HEADER_FORMAT = '<8sI'
+
+# Tiled stores tile flips in the top bits of a gid
+FLIPPED_HORIZONTALLY = 0x80000000
+FLIPPED_VERTICALLY = 0x40000000
+FLIPPED_DIAGONALLY = 0x20000000
+GID_MASK = 0x1FFFFFFF
+
+
+class MapObject:
+    """A Tiled object, with the same attributes Level reads from pytmx objects."""
+
+    def __init__(self, name: Optional[str], x: float, y: float, width: float, height: float, image: Optional[pygame.Surface]):
+        self.name = name
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.image = image
+
+
+class WorldMap:
+    """The Tiled map, parsed once and shared by every subsystem that needs map data or the world size.
+
+    Layer data comes from the binary map cache when it is up to date, otherwise from pytmx, which also rebuilds the cache.
+    """
+
+    def __init__(self, path: str = MAP_PATH, cache_path: str = MAP_CACHE):
+        self.tmx_data = None
+        self.cache = read_cache(cache_path, path)
+        if self.cache is None:
+            self.tmx_data = load_pygame(path)
+            try:
+                write_cache(cache_path, path)
+            except OSError:
+                # The cache is only an optimisation, e.g. a read-only install keeps parsing the map every launch
+                remove_file(cache_path + '.tmp')
+            self.h_tiles = self.tmx_data.width
+            self.v_tiles = self.tmx_data.height
+            tile_width, tile_height = self.tmx_data.tilewidth, self.tmx_data.tileheight
+        else:
+            self.h_tiles = self.cache.header['width']
+            self.v_tiles = self.cache.header['height']
+            tile_width, tile_height = self.cache.header['tilewidth'], self.cache.header['tileheight']
+            self.gid_images = {}
+
+        # Size in pixels
+        self.width = self.h_tiles * tile_width
+        self.height = self.v_tiles * tile_height
+
+    def tiles(self, name: str) -> list[tuple[int, int, pygame.Surface]]:
+        """Tile positions and images of a tile layer, row by row."""
+        if self.tmx_data is not None:
+            return list(self.tmx_data.get_layer_by_name(name).tiles())
+
+        gids = self.cache.layer(name)
+        tiles = []
+        for index, gid in enumerate(gids):
+            if gid:
+                tiles.append((index % self.h_tiles, index // self.h_tiles, self.gid_image(gid)))
+        return tiles
+
+    def objects(self, name: str) -> list[MapObject]:
+        if self.tmx_data is not None:
+            return list(self.tmx_data.get_layer_by_name(name))
+
+        return [MapObject(obj['name'], obj['x'], obj['y'], obj['width'], obj['height'],
+                          self.gid_image(obj['gid']) if obj['gid'] else None)
+                for obj in self.cache.header['objects'][name]]
+
+    def gid_image(self, gid: int) -> pygame.Surface:
+        """The tile image of a raw gid, flipped the same way pytmx flips it."""
+        image = self.gid_images.get(gid)
+        if image is None:
+            tile_gid = gid & GID_MASK
+            for tileset in reversed(self.cache.header['tilesets']):
+                if tile_gid >= tileset['firstgid']:
+                    image = tileset_image(tileset, tile_gid - tileset['firstgid'])
+                    break
+            if gid & FLIPPED_DIAGONALLY:
+                image = pygame.transform.flip(pygame.transform.rotate(image, 270), True, False)
+            if gid & (FLIPPED_HORIZONTALLY | FLIPPED_VERTICALLY):
+                image = pygame.transform.flip(image, bool(gid & FLIPPED_HORIZONTALLY), bool(gid & FLIPPED_VERTICALLY))
+            self.gid_images[gid] = image
+        return image
+
+
+class MapCache:
+    """A memory-mapped cache file, tile layers are read straight from the mapping."""
+
+    def __init__(self, file, header: dict, data_offset: int):
+        self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = header
+        self.data_offset = data_offset
+
+    def layer(self, name: str) -> memoryview:
+        size = self.header['width'] * self.header['height'] * 4
+        start = self.data_offset + self.header['layers'][name] * size
+        return memoryview(self.mapping)[start:start + size].cast('I')
+
+
+def tileset_image(tileset: dict, tile_id: int) -> pygame.Surface:
+    if 'tiles' in tileset:
+        return assets.image(tileset['tiles'][str(tile_id)])
+    x = tileset['margin'] + (tile_id % tileset['columns']) * (tileset['tilewidth'] + tileset['spacing'])
+    y = tileset['margin'] + (tile_id // tileset['columns']) * (tileset['tileheight'] + tileset['spacing'])
+    return assets.image(tileset['image']).subsurface((x, y, tileset['tilewidth'], tileset['tileheight']))
+
+
+def tileset_images(map_path: str = MAP_PATH, cache_path: str = MAP_CACHE) -> list[str]:
+    """The tileset images WorldMap will load through the asset cache, none when pytmx has to parse the map."""
+    cache = read_cache(cache_path, map_path)
+    if cache is None:
+        return []
+    paths = []
+    for tileset in cache.header['tilesets']:
+        paths += tileset['tiles'].values() if 'tiles' in tileset else [tileset['image']]
+    return paths
+
+
+def source_mtimes(map_path: str, tileset_paths: list[str]) -> dict[str, float]:
+    return {path: os.stat(path).st_mtime for path in [map_path] + tileset_paths}
+
+
+def read_cache(cache_path: str, map_path: str) -> Optional[MapCache]:
+    """The cache, or None if it is missing, damaged, from another version or older than the map or any of its tilesets."""
+    if not os.path.exists(cache_path):
+        return None
+    with open(cache_path, 'rb') as file:
+        try:
+            magic, header_size = struct.unpack(HEADER_FORMAT, file.read(struct.calcsize(HEADER_FORMAT)))
+            if magic != CACHE_MAGIC:
+                return None
+            header = json.loads(file.read(header_size))
+            if header['version'] != CACHE_VERSION or header['byteorder'] != sys.byteorder:
+                return None
+            data_offset = align(struct.calcsize(HEADER_FORMAT) + header_size)
+            if os.fstat(file.fileno()).st_size != data_offset + header['data_bytes']:
+                return None
+            if source_mtimes(map_path, list(header['mtimes'])[1:]) != header['mtimes']:
+                return None
+        except (struct.error, ValueError, KeyError, FileNotFoundError):
+            return None
+        return MapCache(file, header, data_offset)
+
+
+def write_cache(cache_path: str, map_path: str) -> None:
+    """Extract the layers, objects and tilesets of the TMX file and its TSX files into the binary cache.
+
+    The file is written next to the cache and then moved over it, so an interrupted write never leaves a partial cache.
+    """
+    root = ElementTree.parse(map_path).getroot()
+    map_folder = os.path.dirname(map_path)
+
+    tilesets = []
+    tileset_paths = []
+    for element in root.iter('tileset'):
+        tileset_path = os.path.normpath(os.path.join(map_folder, element.get('source')))
+        tileset_paths.append(tileset_path)
+        tilesets.append(read_tileset(tileset_path, int(element.get('firstgid'))))
+
+    layers = {}
+    gids = array('I')
+    for element in root.iter('layer'):
+        layers[element.get('name')] = len(layers)
+        gids.extend(int(gid) for gid in element.find('data').text.replace('\n', '').split(',') if gid)
+
+    objects = {}
+    for group in root.iter('objectgroup'):
+        objects[group.get('name')] = [read_object(element) for element in group.iter('object')]
+
+    header = {
+        'version': CACHE_VERSION,
+        'byteorder': sys.byteorder,
+        'mtimes': source_mtimes(map_path, tileset_paths),
+        'width': int(root.get('width')),
+        'height': int(root.get('height')),
+        'tilewidth': int(root.get('tilewidth')),
+        'tileheight': int(root.get('tileheight')),
+        'tilesets': tilesets,
+        'layers': layers,
+        'objects': objects,
+        'data_bytes': len(gids) * gids.itemsize,
+    }
+    header_bytes = json.dumps(header).encode()
+    prefix = struct.pack(HEADER_FORMAT, CACHE_MAGIC, len(header_bytes)) + header_bytes
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(prefix.ljust(align(len(prefix)), b'\0'))
+        gids.tofile(file)
+    os.replace(temp_path, cache_path)
+
+
+def read_tileset(path: str, firstgid: int) -> dict[str, Union[int, str, dict]]:
+    root = ElementTree.parse(path).getroot()
+    folder = os.path.dirname(path)
+    tileset = {'firstgid': firstgid}
+    image = root.find('image')
+    if image is None:
+        # Collection of images, one per tile
+        tileset['tiles'] = {tile.get('id'): os.path.normpath(os.path.join(folder, tile.find('image').get('source')))
+                            for tile in root.iter('tile') if tile.find('image') is not None}
+    else:
+        tileset.update({
+            'image': os.path.normpath(os.path.join(folder, image.get('source'))),
+            'tilewidth': int(root.get('tilewidth')),
+            'tileheight': int(root.get('tileheight')),
+            'columns': int(root.get('columns')),
+            'margin': int(root.get('margin', 0)),
+            'spacing': int(root.get('spacing', 0)),
+        })
+    return tileset
+
+
+def read_object(element: ElementTree.Element) -> dict[str, Union[int, float, str, None]]:
+    gid = int(element.get('gid', 0))
+    width = float(element.get('width', 0))
+    height = float(element.get('height', 0))
+    y = float(element.get('y'))
+    # Tile objects are anchored at their bottom left corner
+    if gid:
+        y -= height
+    return {'name': element.get('name'), 'gid': gid, 'x': float(element.get('x')), 'y': y, 'width': width, 'height': height}
+
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def align(offset: int) -> int:
+    return (offset + 3) // 4 * 4